@@ -0,0 +1,60 @@
+"""A synthetic Trello account whose cards keep changing.
+
+Used by the soak benchmark and by tests, with the simulated clock of
+trellobot.cassette.
+"""
+
+import itertools
+import random
+from datetime import datetime, timezone
+
+
+class ChurnClient:
+    """Simulate an account whose cards keep changing.
+
+    At every listing of boards (i.e. at every scan) some cards are
+    deleted and replaced by new ones, and some have their due date moved
+    or completed. Due dates are within a week from the simulated clock.
+    """
+
+    def __init__(self, clock, boards=10, cards=50, churn=0.05, seed=0):
+        """Create boards with cards, churning a fraction at each scan."""
+        self._clock = clock
+        self._rnd = random.Random(seed)
+        self._ids = itertools.count()
+        self._churn = max(1, int(cards * churn))
+        self.boards = {f'b{i}': {} for i in range(boards)}
+        for cards_ in self.boards.values():
+            for _ in range(cards):
+                self._new_card(cards_)
+
+    def _due(self):
+        """Return a random due date, as Trello would."""
+        t = self._clock.time() + self._rnd.uniform(-86400, 7 * 86400)
+        return datetime.fromtimestamp(t, timezone.utc).isoformat()
+
+    def _new_card(self, cards):
+        cid = f'c{next(self._ids)}'
+        cards[cid] = {'id': cid, 'name': f'Card {cid}', 'url': '',
+                      'desc': '', 'due': self._due(), 'dueComplete': False}
+
+    def _churn_cards(self):
+        for cards in self.boards.values():
+            for _ in range(self._churn):
+                del cards[self._rnd.choice(list(cards))]
+                self._new_card(cards)
+                card = cards[self._rnd.choice(list(cards))]
+                card['due'] = self._due()
+                card = cards[self._rnd.choice(list(cards))]
+                card['dueComplete'] = True
+
+    def fetch_json(self, uri_path, query_params=None, **kwargs):
+        """Serve boards and cards."""
+        if uri_path.startswith('/members/me/boards'):
+            self._churn_cards()
+            boards = [{'id': b, 'name': b, 'url': ''} for b in self.boards]
+            if query_params and query_params.get('cards'):
+                for b in boards:
+                    b['cards'] = list(self.boards[b['id']].values())
+            return boards
+        return list(self.boards[uri_path.split('/')[2]].values())
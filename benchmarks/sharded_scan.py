@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Benchmark sharded board scanning on a synthetic account.
+
+A local stand-in for Trello is served by a separate process over HTTP,
+with thousands of boards. The scan is run in process and with pools of
+increasing size, reporting boards scanned per second. Run from repo root:
+
+    python -m benchmarks.sharded_scan --boards 2000 --cards 50
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest.mock import MagicMock
+
+
+def serve(port, boards, cards, ready):
+    """Serve a synthetic account on localhost."""
+    due = datetime.now(timezone.utc) + timedelta(days=1)
+    board_list = json.dumps([
+        {'id': f'b{i}', 'name': f'Board {i}', 'url': f'http://b{i}'}
+        for i in range(boards)]).encode()
+
+    def card_list(bid):
+        return json.dumps([
+            {'id': f'{bid}c{j}', 'name': f'Card {j} of {bid}',
+             'url': f'http://{bid}/c{j}', 'desc': 'x' * 200,
+             'due': (due + timedelta(minutes=j)).isoformat(),
+             'dueComplete': j % 3 == 0}
+            for j in range(cards)]).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0].rstrip('/')
+            if path == '/members/me/boards':
+                body = board_list
+            else:
+                body = card_list(path.split('/')[2])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', port), Handler)
+    ready.set()
+    server.serve_forever()
+
+
+class LocalClient:
+    """A Trello client talking to the local stand-in."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def fetch_json(self, uri_path, query_params=None, **kwargs):
+        with urllib.request.urlopen(self.base_url + uri_path) as r:
+            return json.loads(r.read())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--boards', type=int, default=2000)
+    ap.add_argument('--cards', type=int, default=50)
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--workers', type=int, nargs='+',
+                    default=[0, 1, 2, 4, 8])
+    args = ap.parse_args()
+
+    from trellobot.bot import TrelloBot
+    from trellobot.cassette import SimClock, SimJobQueue
+    from trellobot.trello import TrelloManager
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=serve, args=(args.port, args.boards, args.cards, ready),
+        daemon=True)
+    server.start()
+    ready.wait()
+    factory = partial(LocalClient, f'http://127.0.0.1:{args.port}')
+
+    print(f'{args.boards} boards x {args.cards} cards, '
+          f'{os.cpu_count()} CPUs')
+    try:
+        base = None
+        for workers in args.workers:
+            tb = TrelloBot(None, None, None)
+            tb._trello = TrelloManager(None, None, None, client=factory())
+            for i in range(args.boards):
+                tb._trello.whitelist_brd(f'b{i}')
+            tb.shard_scan(workers, factory)
+            if tb._scanner is not None:
+                # Warm up the pool, process startup is not measured
+                list(tb._scanner.scan(['b0'] * workers))
+            t0 = time.perf_counter()
+            jq = SimJobQueue(SimClock(time.time()))
+            count = tb._check_due(None, MagicMock(), jq)
+            elapsed = time.perf_counter() - t0
+            tb.shard_scan(0)
+            base = base or elapsed
+            print(f'workers={workers}: {elapsed:.2f}s, '
+                  f'{args.boards / elapsed:.0f} boards/s, '
+                  f'speedup {base / elapsed:.2f}x, '
+                  f'{count["scheduled"]} scheduled')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Soak test: simulate weeks of card churn and check memory is bounded.
+
+The bot scans a synthetic account whose cards keep being created, moved,
+completed and deleted, on a simulated clock. Resident memory is sampled
+every simulated day (with Python allocations, if --traced), and the
+benchmark fails if it keeps growing after the first days. Run from repo
+root:
+
+    python -m benchmarks.soak --days 21 --boards 10 --cards 50
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+
+def rss():
+    """Return resident memory in MiB, if known."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return float('nan')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--days', type=int, default=21)
+    ap.add_argument('--boards', type=int, default=10)
+    ap.add_argument('--cards', type=int, default=50)
+    ap.add_argument('--churn', type=float, default=0.05,
+                    help='fraction of cards changing at every scan')
+    ap.add_argument('--tick', type=float, default=30,
+                    help='simulated minutes between scans')
+    ap.add_argument('--warmup', type=int, default=3,
+                    help='days before memory is expected to be stable')
+    ap.add_argument('--tolerance', type=float, default=0.1,
+                    help='allowed memory growth after warmup, as fraction')
+    ap.add_argument('--traced', action='store_true',
+                    help='also trace Python allocations (much slower)')
+    args = ap.parse_args()
+
+    import trellobot.security as sec
+    from trellobot.bot import TrelloBot
+    from benchmarks.churn import ChurnClient
+    from trellobot.cassette import FakeBot, SimClock, SimJobQueue
+    from trellobot.trello import TrelloManager
+    from types import SimpleNamespace
+
+    clock = SimClock(1500000000.0)
+    client = ChurnClient(clock, args.boards, args.cards, args.churn)
+    bot = FakeBot(keep=False)
+    jq = SimJobQueue(clock, bot, keep_timings=False)
+    TrelloBot.check_int = args.tick
+    tb = TrelloBot(None, None, None, clock=clock.now)
+    tb._trello = TrelloManager(None, None, None, client=client)
+    for b in client.boards:
+        tb._trello.whitelist_brd(b)
+    update = SimpleNamespace(message=SimpleNamespace(chat_id=42))
+    sec.authorized_user = 42
+
+    if args.traced:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    tb.start(bot, update, jq)
+    resident = []
+    print(f'{args.boards} boards x {args.cards} cards, '
+          f'{args.churn:.0%} churn every {args.tick:g} min')
+    print('day  traced MiB  RSS MiB  jobs  queue  cards  indexed  messages')
+    for day in range(1, args.days + 1):
+        jq.run_until(clock.time() + 86400)
+        gc.collect()
+        resident.append(rss())
+        traced = tracemalloc.get_traced_memory()[0] / 2 ** 20 \
+            if args.traced else float('nan')
+        print(f'{day:3d}  {traced:10.2f}  {resident[-1]:7.1f}  '
+              f'{len(tb._jobs):4d}  {len(jq):5d}  {len(tb._cards):5d}  '
+              f'{len(tb._index):7d}  {bot.count["send_message"]:8d}')
+    elapsed = time.perf_counter() - t0
+    print(f'{args.days} days simulated in {elapsed:.1f}s, '
+          f'{jq.runs["check_updates"]} scans')
+
+    base = max(resident[:args.warmup])
+    growth = resident[-1] / base - 1
+    print(f'resident memory growth after warmup: {growth:+.1%}')
+    if growth > args.tolerance:
+        print('FAIL: memory is not bounded')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Benchmark startup: imports, time-to-first-response, time-to-scheduled.
+
+Trello is replaced by a fake client answering after a fixed latency, and
+Telegram by a bot recording when messages are sent. Run from repo root:
+
+    python -m benchmarks.startup --boards 50 --cards 40 --latency 0.05
+"""
+
+import argparse
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+
+class FakeTrello:
+    """Serve a synthetic account, sleeping to simulate network latency."""
+
+    def __init__(self, boards, cards, latency):
+        self.latency = latency
+        self.boards = [{'id': f'b{i}', 'name': f'Board {i}',
+                        'url': f'http://b{i}'} for i in range(boards)]
+        due = datetime.now(timezone.utc) + timedelta(days=1)
+        self.cards = [{'id': f'c{j}', 'name': f'Card {j}', 'url': '',
+                       'due': due.isoformat(), 'dueComplete': False}
+                      for j in range(cards)]
+
+    def fetch_json(self, path, **kwargs):
+        time.sleep(self.latency)
+        if path.startswith('/members/me/boards'):
+            return self.boards
+        bid = path.split('/')[2]
+        return [dict(c, id=f'{bid}-{c["id"]}') for c in self.cards]
+
+
+class FakeJobQueue:
+    """Run one-shot jobs in threads, record repeating ones."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.threads = []
+        self.errors = []
+
+    def _run(self, callback, job):
+        try:
+            callback(self.bot, job)
+        except Exception as e:
+            self.errors.append(e)
+            raise
+
+    def run_once(self, callback, when, context=None):
+        job = MagicMock(context=context)
+        job.job_queue = self
+        if when == 0:
+            t = threading.Thread(target=self._run, args=(callback, job))
+            t.start()
+            self.threads.append(t)
+        return job
+
+    def run_repeating(self, callback, interval, first=None, context=None):
+        return MagicMock(context=context)
+
+
+def import_time(module):
+    """Measure import time of a module in a fresh interpreter."""
+    code = f'import time; t = time.perf_counter(); import {module}; ' \
+           f'print(time.perf_counter() - t)'
+    return float(subprocess.check_output([sys.executable, '-c', code]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--boards', type=int, default=50)
+    ap.add_argument('--cards', type=int, default=40)
+    ap.add_argument('--latency', type=float, default=0.05)
+    args = ap.parse_args()
+
+    import trellobot.security as sec
+    from trellobot.bot import TrelloBot
+    from trellobot.trello import TrelloManager
+
+    print(f'import trellobot.bot: {import_time("trellobot.bot"):.3f}s')
+    print(f'import telegram.ext: {import_time("telegram.ext"):.3f}s')
+    print(f'import trello: {import_time("trello"):.3f}s')
+
+    fake = FakeTrello(args.boards, args.cards, args.latency)
+    tb = TrelloBot(None, None, None)
+    tb._trello = TrelloManager(None, None, None, client=fake)
+    for b in fake.boards:
+        tb._trello.whitelist_brd(b['id'])
+
+    first = []
+    bot = MagicMock()
+    bot.send_message.side_effect = lambda **kw: first.append(
+        time.perf_counter()) or MagicMock()
+    update = MagicMock()
+    update.message.chat_id = sec.authorized_user = 1
+    jq = FakeJobQueue(bot)
+
+    t0 = time.perf_counter()
+    tb.start(bot, update, jq)
+    for t in jq.threads:
+        t.join()
+    t1 = time.perf_counter()
+
+    print(f'{args.boards} boards x {args.cards} cards, '
+          f'{args.latency * 1000:.0f}ms per call')
+    print(f'time-to-first-response: {first[0] - t0:.4f}s')
+    print(f'time-to-fully-scheduled: {t1 - t0:.4f}s')
+    print(f'cards scheduled: {len(tb._jobs)}')
+    if jq.errors or not tb._jobs:
+        print('FAIL: scan did not complete')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 """Starts TrelloBot."""
 
 
+import argparse
 # Some logging
 import logging
 
@@ -9,6 +10,25 @@ import trellobot.security as sec
 from trellobot.bot import TrelloBot
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Start TrelloBot.')
+    # Workers fetch with their own clients, which are not recorded
+    scanning = parser.add_mutually_exclusive_group()
+    scanning.add_argument('--record', metavar='CASSETTE',
+                          help='record Trello and Telegram traffic to file')
+    scanning.add_argument('--scan-workers', type=int, default=0, metavar='N',
+                          help='scan boards with N worker processes')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='export Chrome trace of slow scans to file')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='save due dates snapshot to file on /report')
+    parser.add_argument('--workers', type=int, default=4, metavar='N',
+                        help='run command handlers with N threads')
+    parser.add_argument('--webhook', metavar='HOST:PORT',
+                        help='receive updates on a local webhook listener')
+    parser.add_argument('--webhook-url', metavar='URL',
+                        help='public URL of the listener, set on Telegram')
+    args = parser.parse_args()
+
     # Some logging
     logging.basicConfig(
         level=logging.INFO,
@@ -27,4 +47,25 @@ if __name__ == '__main__':
 
     # Create bot and run polling main loop
     tb = TrelloBot(trello_key, trello_secret, trello_token)
-    tb.run_bot(bot_key)
+    if args.record:
+        from trello import TrelloClient
+        from trellobot.cassette import Cassette, RecordingClient
+        from trellobot.trello import TrelloManager
+        tb.cassette = Cassette(args.record)
+        client = TrelloClient(trello_key, trello_secret, trello_token)
+        tb._trello = TrelloManager(
+            trello_key, trello_secret, trello_token,
+            client=RecordingClient(client, tb.cassette),
+        )
+    if args.trace:
+        from trellobot.tracing import tracer
+        tracer.enabled = True
+        tb.trace_path = args.trace
+    tb.snapshot_path = args.snapshot
+    if args.scan_workers:
+        tb.shard_scan(args.scan_workers)
+    webhook = None
+    if args.webhook:
+        host, port = args.webhook.rsplit(':', 1)
+        webhook = (host, int(port))
+    tb.run_bot(bot_key, args.workers, webhook, args.webhook_url)
@@ -0,0 +1,69 @@
+"""Test statistics over snapshots."""
+
+
+from trellobot.analytics import Snapshot
+from trellobot.bot import TrelloBot
+from trellobot.entities import Card
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import numpy as np
+
+
+NOW = 1500000000.0
+
+
+def card(cid, hours, complete=False):
+    """Make a card due some hours from NOW."""
+    due = datetime.fromtimestamp(NOW + hours * 3600, timezone.utc)
+    return Card(cid, cid, '', due, complete)
+
+
+def make_snapshot():
+    """Build a snapshot of cards on two boards."""
+    tracked = {
+        'a': ('b1', card('a', -48)),
+        'b': ('b1', card('b', -2)),
+        'c': ('b2', card('c', -1)),
+        'd': ('b2', card('d', 5, True)),
+        'e': ('b2', card('e', 200)),
+    }
+    completed = {'d': NOW + 7 * 3600}
+    return Snapshot.build(tracked, completed)
+
+
+def test_aggregates():
+    """Test overdue counts, histogram and completion latency."""
+    snap = make_snapshot()
+    assert snap.overdue_by_board(NOW) == {'b1': 2, 'b2': 1}
+    hist = snap.due_histogram(NOW)
+    assert sum(hist.values()) == 4
+    assert hist['1d-1w ago'] == 1 and hist['<1d ago'] == 2
+    assert hist['1w-1m'] == 1
+    assert snap.completion_latency()['median'] == 2.0
+    assert 'b1: 2' in snap.report(NOW)
+    assert 'Foo: 2' in snap.report(NOW, {'b1': 'Foo'})
+
+
+def test_save_load(tmp_path):
+    """Test that snapshot survives a round trip to file."""
+    snap = make_snapshot()
+    # Path is used as is, without adding .npz
+    path = str(tmp_path / 'snap')
+    snap.save(path)
+    loaded = Snapshot.load(path)
+    for a, b in zip(snap, loaded):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_bot_observes_completion():
+    """Test that the bot tracks cards and when they get completed."""
+    tb = TrelloBot(1, 2, 3)
+    tb._trello = MagicMock()
+    tb._trello.fetch_cards.return_value = [card('a', 2), card('b', 3)]
+    tb._update_due('b1', MagicMock(), MagicMock())
+    tb._trello.fetch_cards.return_value = [card('a', 2, True), card('b', 3)]
+    tb._update_due('b1', MagicMock(), MagicMock())
+    snap = tb.snapshot()
+    assert sorted(snap.ids) == ['a', 'b']
+    assert list(snap.boards) == ['b1']
+    assert np.isnan(snap.completed).sum() == 1
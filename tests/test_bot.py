@@ -1,5 +1,178 @@
 """Test for the actual bot."""
 
 
+import threading
+import time
+import trellobot.security as sec
+from collections import Counter
+from trellobot.bot import TrelloBot
+from unittest.mock import MagicMock
+
+
 def test_bot():
     assert True
+
+
+def test_start_does_not_block_on_scan():
+    """Test that /start replies and defers the board scan to a job."""
+    tb = TrelloBot(1, 2, 3)
+    tb._trello = MagicMock()
+    bot = MagicMock()
+    update = MagicMock()
+    update.message.chat_id = sec.authorized_user = 42
+    jq = MagicMock()
+
+    tb.start(bot, update, jq)
+    # Welcome was sent, but no board was fetched yet
+    assert bot.send_message.call_count > 0
+    assert tb._trello.fetch_board_cards.call_count == 0
+    assert jq.run_repeating.call_count == 1
+    # Scan is enqueued to run immediately
+    callback, when = jq.run_once.call_args[0]
+    assert callback == tb._initial_scan and when == 0
+
+    # Running the job performs the scan
+    tb._trello.fetch_board_cards.return_value = []
+    tb._trello.boards = {}
+    callback(bot, MagicMock(context=jq.run_once.call_args[1]['context']))
+    assert tb._trello.fetch_board_cards.call_count == 1
+
+
+def test_initial_scan_is_sharded():
+    """Test that the scan after /start uses the sharded scanner."""
+    from trellobot.entities import Board
+    tb = TrelloBot(1, 2, 3)
+    boards = [Board('b1', 'Foo', False, ''), Board('b2', 'Bar', True, '')]
+    tb._trello = MagicMock(boards={b.id: b for b in boards})
+    tb._trello.list_boards.return_value = boards
+    tb._scanner = MagicMock()
+    tb._scanner.scan.return_value = [('b1', [])]
+    bot = MagicMock()
+
+    tb._initial_scan(bot, MagicMock(context=42))
+    tb._scanner.scan.assert_called_once_with(['b1'])
+    assert tb._trello.fetch_board_cards.call_count == 0
+    texts = [c[1]['text'] for c in bot.editMessageText.call_args_list]
+    assert any('[Foo]' in t for t in texts)
+    assert any('[Bar]' in t for t in texts)
+
+
+def test_notifications_are_coalesced():
+    """Test that notifications in the same window produce one digest."""
+    tb = TrelloBot(1, 2, 3)
+    bot = MagicMock()
+    jq = MagicMock()
+    for i in range(200):
+        tb._notify(bot, 42, f'Card {i} is due', jq)
+    # A single flush job was scheduled for the chat
+    assert jq.run_once.call_count == 1
+    assert bot.send_message.call_count == 0
+    # Flushing sends everything in a single message
+    job = MagicMock(context=jq.run_once.call_args[1]['context'])
+    tb._send_digest(None, job)
+    assert bot.send_message.call_count == 1
+
+
+def test_concurrent_scans_fetch_once():
+    """Test that overlapping scans do a single fetch per board."""
+    tb = TrelloBot(1, 2, 3)
+    fetches = Counter()
+    started, release = threading.Event(), threading.Event()
+
+    def fetch_json(path, query_params=None):
+        fetches[path] += 1
+        if path == '/members/me/boards/':
+            started.set()
+            release.wait(5)
+            return [{'id': 'b1', 'name': 'foo', 'url': ''}]
+        return []
+    tb._trello._client = MagicMock()
+    tb._trello._client.fetch_json.side_effect = fetch_json
+    tb._trello.whitelist_brd('b1')
+
+    def scan():
+        tb._scan(None, MagicMock(), MagicMock())
+    threads = [threading.Thread(target=scan) for _ in range(4)]
+    threads[0].start()
+    started.wait(1)
+    for t in threads[1:]:
+        t.start()
+    deadline = time.monotonic() + 5
+    while tb._scans.joined < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert tb._scans.joined == 3
+    assert fetches == {'/members/me/boards/': 1, '/boards/b1/cards': 1}
+
+
+def test_periodic_checks_skip_scan_in_flight():
+    """Test that ticks during a scan take no worker and send nothing."""
+    tb = TrelloBot(1, 2, 3)
+    started, release = threading.Event(), threading.Event()
+
+    def check_due(*args):
+        started.set()
+        release.wait(5)
+        return Counter()
+    tb._traced_check_due = check_due
+    scan = threading.Thread(target=tb._scan,
+                            args=(None, MagicMock(), MagicMock()))
+    scan.start()
+    assert started.wait(1)
+    tb._dispatcher = MagicMock()
+    bot = MagicMock()
+    for _ in range(2):
+        tb.check_updates(bot, MagicMock(context=42))
+    release.set()
+    scan.join()
+    assert tb._dispatcher.run_async.call_count == 0
+    assert bot.send_message.call_count == 0
+    # Once the scan is over, ticks scan again
+    tb.check_updates(bot, MagicMock(context=42))
+    assert tb._dispatcher.run_async.call_count == 1
+
+
+def test_unschedule_twice():
+    """Test that unscheduling an unknown card is harmless."""
+    tb = TrelloBot(1, 2, 3)
+    tb._unschedule_due('foo', None, None)
+
+
+def test_long_run_state_is_bounded(monkeypatch):
+    """Test that days of churning cards do not accumulate state."""
+    from benchmarks.churn import ChurnClient
+    from trellobot.cassette import FakeBot, SimClock, SimJobQueue
+    from trellobot.trello import TrelloManager
+    from types import SimpleNamespace
+    monkeypatch.setattr(TrelloBot, 'check_int', 60)
+    clock = SimClock(1500000000.0)
+    client = ChurnClient(clock, boards=3, cards=20, churn=0.1)
+    bot = FakeBot(keep=False)
+    jq = SimJobQueue(clock, bot, keep_timings=False)
+    tb = TrelloBot(None, None, None, clock=clock.now)
+    tb._trello = TrelloManager(None, None, None, client=client)
+    for b in client.boards:
+        tb._trello.whitelist_brd(b)
+    update = SimpleNamespace(message=SimpleNamespace(chat_id=42))
+    sec.authorized_user = 42
+
+    tb.start(bot, update, jq)
+    for _ in range(4):
+        jq.run_until(clock.time() + 86400)
+        live = {c for cards in client.boards.values() for c in cards}
+        assert set(tb._cards) == live
+        assert len(tb._index) == len(live)
+        assert set(tb._jobs) <= live
+        assert set(tb._trello.planner.sizes) <= set(client.boards)
+    # Scan and due jobs only hold the chat and card IDs, not the update
+    for _, _, job in jq._queue:
+        if job.removed or job.callback == tb._send_digest:
+            continue
+        if job.callback == tb.check_updates:
+            assert job.context == 42
+        else:
+            assert job.context == (42, job.context[1])
+            assert isinstance(job.context[1], str)
+    assert bot.count['send_message'] > 0
@@ -0,0 +1,67 @@
+"""Test collapsing of concurrent calls."""
+
+
+import threading
+import time
+import pytest
+from trellobot.flight import SingleFlight
+
+
+def run_concurrently(n, target):
+    """Run target in n threads, return their results."""
+    results = [None] * n
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_are_collapsed():
+    """Test that calls in flight are joined, and later ones run again."""
+    sf = SingleFlight()
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    leader = threading.Thread(target=sf.do, args=('k', slow))
+    leader.start()
+    started.wait(1)
+    assert sf.in_flight('k')
+
+    def release_when_joined():
+        while sf.joined < 5:
+            time.sleep(0.001)
+        release.set()
+    # Release the leader once all followers have joined
+    threading.Thread(target=release_when_joined).start()
+    results = run_concurrently(5, lambda: sf.do('k', slow))
+    leader.join()
+    assert results == [1] * 5
+    assert len(calls) == 1 and sf.joined == 5
+    assert not sf.in_flight('k')
+    # A new call runs again
+    assert sf.do('k', slow) == 2
+
+
+def test_errors_are_shared():
+    """Test that an exception is raised to every caller."""
+    sf = SingleFlight()
+
+    def fail():
+        raise RuntimeError('boom')
+    with pytest.raises(RuntimeError):
+        sf.do('k', fail)
+    assert not sf.in_flight('k')
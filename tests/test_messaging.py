@@ -1,7 +1,7 @@
 """Test messaging module."""
 
 
-from trellobot.messaging import Messenger
+from trellobot.messaging import Messenger, Digest
 from unittest.mock import MagicMock
 
 
@@ -66,3 +66,56 @@ def test_messenger_edits():
         assert bot.send_message.call_count == 1
         # An edit command should have been issued
         assert bot.editMessageText.call_count == 2
+
+
+def test_digest_groups_and_splits():
+    """Test that a digest sends few messages, within the size limit."""
+    ctx = MagicMock()
+    digest = Digest(ctx)
+    assert digest.flush() == 0
+
+    # First line reports the digest was empty
+    assert digest.add('foo')
+    assert not digest.add('bar')
+    assert digest.flush() == 1
+    assert 'foo' in ctx.send.call_args[0][0]
+    assert 'bar' in ctx.send.call_args[0][0]
+
+    # Many lines are split in messages not exceeding the limit
+    ctx.reset_mock()
+    for i in range(200):
+        digest.add('x' * 100)
+    sent = digest.flush()
+    assert sent == ctx.send.call_count
+    assert 1 < sent < 200
+    for args, _ in ctx.send.call_args_list:
+        assert len(args[0]) <= Digest.max_length
+
+
+def test_digest_survives_bad_lines():
+    """Test that a line failing to send does not lose the others."""
+    ctx = MagicMock()
+
+    def send(text, markdown=True):
+        if markdown and 'bad_name' in text:
+            raise ValueError("Can't parse entities")
+    ctx.send.side_effect = send
+    digest = Digest(ctx)
+    for i in range(5):
+        digest.add(f'Card [card {i}](url) due')
+    digest.add('Card [bad_name](url) due')
+    # Lines are sent one by one, the bad one as plain text
+    assert digest.flush() == 6
+    texts = [args[0] for args, _ in ctx.send.call_args_list]
+    for i in range(5):
+        assert f'Card [card {i}](url) due' in texts
+    assert ctx.send.call_args_list[-1][1] == {'markdown': False}
+
+    # Long lines are not cut within their links
+    ctx.reset_mock()
+    ctx.send.side_effect = None
+    link = '[' + 'x' * 5000 + '](url)'
+    digest.add('foo')
+    digest.add(link)
+    assert digest.flush() == 2
+    assert ctx.send.call_args_list[-1][0][0] == link
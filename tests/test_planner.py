@@ -0,0 +1,31 @@
+"""Test choice of fetch plans."""
+
+
+from trellobot.planner import FetchPlanner
+
+
+def test_model_fit():
+    """Test that the cost model is fitted on observations."""
+    fp = FetchPlanner()
+    for i in range(200):
+        cards = i % 50
+        fp.observe(cards, 0.1 + 0.01 * cards)
+    overhead, per_card = fp.model()
+    assert abs(overhead - 0.1) < 0.01
+    assert abs(per_card - 0.01) < 0.001
+
+
+def test_choice_depends_on_whitelist():
+    """Test that few whitelisted boards are fetched one by one."""
+    fp = FetchPlanner()
+    boards = [f'b{i}' for i in range(100)]
+    for b in boards:
+        fp.sizes[b] = 20
+    assert fp.choose(boards[:2], boards) == 'board'
+    assert fp.choose(boards[:90], boards) == 'account'
+    # A huge non-whitelisted board makes the account plan expensive
+    fp.sizes['b99'] = 10 ** 6
+    assert fp.choose(boards[:90], boards) == 'board'
+    # Never use unsupported plans
+    fp.account_supported = False
+    assert fp.choose(boards, boards) == 'board'
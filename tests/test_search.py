@@ -0,0 +1,72 @@
+"""Test full-text search over cards."""
+
+
+from trellobot.bot import TrelloBot
+from trellobot.entities import Card
+from trellobot.search import InvertedIndex
+from unittest.mock import MagicMock, patch
+
+
+def docs(*names):
+    """Make (id, text, payload) docs from names."""
+    return [(n, n, n) for n in names]
+
+
+def test_search_ranks_matches():
+    """Test that documents matching all words are ranked."""
+    idx = InvertedIndex()
+    idx.sync('b1', docs('buy milk', 'buy bread and milk', 'call mom'))
+    idx.sync('b2', docs('milk milk the cow'))
+    found = [p for _, p in idx.search('milk')]
+    assert set(found) == {'buy milk', 'buy bread and milk',
+                          'milk milk the cow'}
+    assert found[0] == 'milk milk the cow'
+    assert [p for _, p in idx.search('buy milk')][0] == 'buy milk'
+    # Last word is a prefix
+    assert [p for _, p in idx.search('bre')] == ['buy bread and milk']
+    assert idx.search('buy mom') == []
+    assert idx.search('') == []
+
+
+def test_sync_is_incremental():
+    """Test that syncing updates changed documents and drops missing ones."""
+    idx = InvertedIndex()
+    assert idx.sync('b1', docs('foo', 'bar')) == 2
+    # Nothing changed
+    assert idx.sync('b1', docs('foo', 'bar')) == 0
+    # One changed, one removed
+    assert idx.sync('b1', [('foo', 'qux', 'foo')]) == 2
+    assert len(idx) == 1
+    assert idx.search('bar') == []
+    assert [p for _, p in idx.search('qux')] == ['foo']
+    idx.retain([])
+    assert len(idx) == 0
+    assert idx.search('qux') == []
+
+
+def test_find_command():
+    """Test that /find answers from the index, without Trello calls."""
+    tb = TrelloBot(1, 2, 3)
+    tb._trello = MagicMock()
+    tb._trello.fetch_cards.return_value = [
+        Card('c1', 'Write report', 'u', None, False),
+        Card('c2', 'Read book', 'u', None, False, 'a report on birds'),
+    ]
+    tb._update_due('b1', MagicMock(), MagicMock())
+    tb._trello.reset_mock()
+
+    update = MagicMock()
+    update.message.text = '/find report'
+    ctx = MagicMock()
+    with patch('trellobot.bot.security_check', return_value=[ctx]):
+        tb.find(None, update)
+    assert 'Write report' in ctx.send.call_args[0][0]
+    assert 'Read book' not in ctx.send.call_args[0][0]
+    assert not tb._trello.method_calls
+
+    # Queries are echoed as plain text, not to break markdown
+    update.message.text = '/find foo_bar'
+    with patch('trellobot.bot.security_check', return_value=[ctx]):
+        tb.find(None, update)
+    assert 'foo_bar' in ctx.send.call_args[0][0]
+    assert ctx.send.call_args[1] == {'markdown': False}
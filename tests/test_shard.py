@@ -0,0 +1,63 @@
+"""Test sharded scanning."""
+
+
+from trellobot.bot import TrelloBot
+from trellobot.shard import ShardedScanner, _pack, _unpack
+from trellobot.entities import Card, CheckItem
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import pytest
+
+
+class FakeClient:
+    """Serve two cards per board, picklable for workers."""
+
+    def fetch_json(self, path, **kwargs):
+        if path == '/members/me/boards/':
+            return [{'id': f'b{i}', 'name': '', 'url': ''} for i in range(5)]
+        bid = path.split('/')[2]
+        return [{'id': f'{bid}c{j}', 'name': '', 'url': '',
+                 'due': '2100-01-01T10:00:00.000Z' if j else None,
+                 'dueComplete': False} for j in range(2)]
+
+
+def test_pack_roundtrip():
+    """Test that compact summaries preserve cards."""
+    due = datetime(2100, 1, 1, 10, tzinfo=timezone.utc)
+    for card in [Card('a', 'foo', 'url', due, False),
+                 Card('b', 'bar', 'url', None, True),
+                 CheckItem('c', 'baz', 'url', due, False, 'a')]:
+        assert _unpack(_pack(card)) == card
+
+
+def test_sharded_scan_matches_serial():
+    """Test that scanning with workers schedules the same cards."""
+    scanner = ShardedScanner(FakeClient, 2)
+    try:
+        got = dict(scanner.scan([f'b{i}' for i in range(5)]))
+    finally:
+        scanner.close()
+    assert sorted(got) == [f'b{i}' for i in range(5)]
+    assert all(len(cards) == 2 for cards in got.values())
+
+    jobs = []
+    for workers in (0, 2):
+        tb = TrelloBot(1, 2, 3)
+        tb._trello._client = FakeClient()
+        for i in range(5):
+            tb._trello.whitelist_brd(f'b{i}')
+        tb.shard_scan(workers, FakeClient)
+        count = tb._check_due(None, MagicMock(), MagicMock())
+        tb.shard_scan(0)
+        assert count['scheduled'] == 5
+        jobs.append(sorted(tb._jobs))
+    assert jobs[0] == jobs[1]
+
+
+def test_sharding_refused_while_recording():
+    """Test that sharded scans, which would not be recorded, are refused."""
+    tb = TrelloBot(1, 2, 3)
+    tb.cassette = MagicMock()
+    with pytest.raises(ValueError):
+        tb.shard_scan(2, FakeClient)
+    assert tb._scanner is None
@@ -0,0 +1,56 @@
+"""Test tracing of scans."""
+
+
+import json
+from trellobot.bot import TrelloBot
+from trellobot.tracing import Tracer, tracer
+from unittest.mock import MagicMock
+
+
+def test_disabled_tracer_records_nothing():
+    """Test that spans are not recorded when tracing is disabled."""
+    tr = Tracer()
+    with tr.span('foo', bar=1):
+        pass
+    assert len(tr.events) == 0
+    # The same no-op span is always returned
+    assert tr.span('foo') is tr.span('bar')
+
+
+def test_nested_spans_export(tmp_path):
+    """Test that nested spans are exported as Chrome trace events."""
+    tr = Tracer()
+    tr.enabled = True
+    with tr.span('outer'):
+        with tr.span('inner', board='b1'):
+            pass
+    path = tmp_path / 'trace.json'
+    assert tr.export(str(path)) == 2
+    events = json.load(open(path))['traceEvents']
+    inner, outer = events
+    assert (inner['name'], outer['name']) == ('inner', 'outer')
+    assert inner['ph'] == 'X' and inner['args'] == {'board': 'b1'}
+    # Inner span is contained in outer span
+    assert outer['ts'] <= inner['ts']
+    assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+
+
+def test_slow_scan_is_exported(tmp_path):
+    """Test that a slow scan exports its trace."""
+    tb = TrelloBot(1, 2, 3)
+    tb._trello._client = MagicMock()
+    tb._trello._client.fetch_json.side_effect = [
+        [{'id': 'b1', 'name': 'foo', 'url': ''}],  # Boards
+        [],  # Cards
+    ]
+    tb._trello.whitelist_brd('b1')
+    tb.trace_path = str(tmp_path / 'trace.json')
+    tb.slow_scan = 0
+    tracer.enabled = True
+    try:
+        tb._traced_check_due(None, MagicMock(), MagicMock())
+    finally:
+        tracer.enabled = False
+    names = {e['name'] for e in json.load(open(tb.trace_path))['traceEvents']}
+    assert {'_check_due', 'fetch_boards', '_update_due', 'fetch_cards',
+            'schedule'} <= names
@@ -0,0 +1,35 @@
+"""Test columns of tracked due dates."""
+
+
+from trellobot.tracked import TrackedDues
+import numpy as np
+
+
+def test_columns_follow_cards():
+    """Test that snapshots reflect sets and removals, reusing rows."""
+    td = TrackedDues()
+    snap = td.snapshot()
+    assert len(snap.ids) == 0 and len(snap.due) == 0
+
+    td.set('a', 'b1', 100.0, False)
+    td.set('b', 'b2', 200.0, True, 250.0)
+    td.set('c', 'b1', 300.0, False)
+    td.remove('a')
+    td.remove('foo')
+    assert len(td) == 2 and 'a' not in td
+    assert td.completed_at('b') == 250.0 and np.isnan(td.completed_at('c'))
+    # Row of removed card is reused
+    td.set('d', 'b2', 400.0, False)
+    assert len(td.ids) == 3
+
+    snap = td.snapshot()
+    rows = {i: k for k, i in enumerate(snap.ids)}
+    assert set(rows) == {'b', 'c', 'd'}
+    assert snap.boards[snap.board[rows['c']]] == 'b1'
+    assert snap.boards[snap.board[rows['d']]] == 'b2'
+    assert snap.due[rows['d']] == 400.0
+    assert snap.complete.tolist() == [i == 'b' for i in snap.ids]
+    assert snap.overdue_by_board(350.0) == {'b1': 1}
+    # Snapshots do not change with the columns
+    td.set('c', 'b1', 500.0, False)
+    assert snap.due[rows['c']] == 300.0
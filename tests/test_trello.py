@@ -2,7 +2,7 @@
 
 
 from trellobot.trello import TrelloManager
-from trellobot.entities import Organization
+from trellobot.entities import Organization, Card, CheckItem
 from unittest.mock import patch
 from types import MethodType
 
@@ -74,3 +74,63 @@ def test_fetch_org_boards():
         tc = tcmock()
         tm = TrelloManager(1, 2, 3)
         assert tm._cl == tc
+
+
+def test_fetch_board_cards_plans():
+    """Test that cards are fetched with a single request when convenient."""
+    with patch('trellobot.trello.TrelloClient') as tcmock:
+        tc = tcmock()
+        tm = TrelloManager(1, 2, 3)
+        card = {'id': 'c', 'name': 'c', 'url': '', 'due': None,
+                'dueComplete': False}
+        boards = [{'id': f'b{i}', 'name': '', 'url': '', 'cards': [card]}
+                  for i in range(10)]
+        for i in range(9):
+            tm.whitelist_brd(f'b{i}')
+
+        # Boards are unknown: fetch them, then cards one by one
+        tc.fetch_json.side_effect = [boards] + [[card]] * 9
+        assert len(list(tm.fetch_board_cards())) == 9
+        assert tm.plan == 'board'
+        assert tc.fetch_json.call_count == 10
+
+        # Most boards are whitelisted: fetch everything at once
+        tc.fetch_json.reset_mock(side_effect=True)
+        tc.fetch_json.return_value = boards
+        fetched = list(tm.fetch_board_cards())
+        assert tm.plan == 'account'
+        assert tc.fetch_json.call_count == 1
+        assert sorted(b for b, _ in fetched) == [f'b{i}' for i in range(9)]
+
+        # If nested cards are not returned, fall back to board plan
+        plain = [{k: v for k, v in b.items() if k != 'cards'} for b in boards]
+        tc.fetch_json.reset_mock()
+        tc.fetch_json.side_effect = [plain, plain] + [[card]] * 9
+        assert len(list(tm.fetch_board_cards())) == 9
+        assert tm.plan == 'board'
+        assert not tm.planner.account_supported
+
+
+def test_fetch_cards_with_checkitems():
+    """Test that check items with due are parsed from the same request."""
+    with patch('trellobot.trello.TrelloClient') as tcmock:
+        tc = tcmock()
+        tm = TrelloManager(1, 2, 3)
+        tc.fetch_json.return_value = [{
+            'id': 'c1', 'name': 'foo', 'url': 'http://foo', 'due': None,
+            'dueComplete': False,
+            'checklists': [{'checkItems': [
+                {'id': 'i1', 'name': 'bar', 'state': 'complete',
+                 'due': '2100-01-01T10:00:00.000Z'},
+                {'id': 'i2', 'name': 'baz', 'state': 'incomplete',
+                 'due': None},
+            ]}],
+        }]
+        card, item = tm.fetch_cards(bid='b1', checkitems=True)
+        assert tc.fetch_json.call_count == 1
+        assert tc.fetch_json.call_args[1]['query_params'] == {
+            'checklists': 'all'}
+        assert isinstance(card, Card) and card.id == 'c1'
+        assert isinstance(item, CheckItem)
+        assert (item.id, item.idCard, item.url) == ('i1', 'c1', 'http://foo')
+        assert item.dueComplete and item.due.year == 2100
@@ -0,0 +1,85 @@
+"""Test webhook intake and handlers off the dispatch path."""
+
+
+import http.client
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from trellobot.bot import TrelloBot
+from trellobot.webhook import WebhookListener
+from unittest.mock import MagicMock
+
+
+# An update as POSTed by Telegram
+UPDATE = {
+    'update_id': 1000,
+    'message': {
+        'message_id': 1,
+        'date': 1500000000,
+        'chat': {'id': 42, 'type': 'private'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'foo'},
+        'text': '/update',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 7}],
+    },
+}
+
+
+def post(port, path, data):
+    """POST data to the listener, return status code."""
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data)
+    try:
+        with urllib.request.urlopen(req) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_listener_enqueues_updates():
+    """Test that POSTed updates are decoded and enqueued."""
+    q = queue.Queue()
+    listener = WebhookListener(MagicMock(), q, port=0, path='/secret')
+    listener.start()
+    try:
+        assert post(listener.port, '/secret', json.dumps(UPDATE).encode()) \
+            == 200
+        update = q.get(timeout=1)
+        assert update.update_id == 1000
+        assert update.message.text == '/update'
+        assert update.message.chat_id == 42
+        # Wrong path or data are refused
+        assert post(listener.port, '/', json.dumps(UPDATE).encode()) == 404
+        assert post(listener.port, '/secret', b'foo') == 400
+        bad = {'update_id': 'x', 'message': 5}
+        assert post(listener.port, '/secret', json.dumps(bad).encode()) \
+            == 400
+        conn = http.client.HTTPConnection('127.0.0.1', listener.port)
+        conn.putrequest('POST', '/secret')
+        conn.putheader('Content-Length', 'foo')
+        conn.endheaders()
+        assert conn.getresponse().status == 400
+        conn.close()
+        assert q.empty()
+    finally:
+        listener.stop()
+
+
+def test_slow_handlers_do_not_block():
+    """Test that slow handlers run in the worker pool."""
+    tb = TrelloBot(1, 2, 3)
+    running, release = threading.Event(), threading.Event()
+
+    def slow(bot, update, job_queue=None):
+        running.set()
+        release.wait(5)
+
+    disp = MagicMock()
+    disp.run_async.side_effect = lambda f, *a, **kw: threading.Thread(
+        target=f, args=a, kwargs=kw).start()
+    tb._dispatcher = disp
+    # The handler returns while the slow callback is still running
+    tb._async_handler(slow)(None, None, job_queue=None)
+    assert running.wait(1)
+    assert disp.run_async.call_count == 1
+    release.set()
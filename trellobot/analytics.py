@@ -0,0 +1,115 @@
+"""Statistics over tracked due dates, computed on columnar snapshots.
+
+A Snapshot holds one NumPy array per column, one row per tracked card or
+check item. It can be saved as .npz and loaded for offline analysis:
+
+    python -m trellobot.analytics snapshot.npz
+"""
+
+
+from collections import namedtuple
+import numpy as np
+
+
+# Bins of the due date histogram, in days from now
+DUE_BINS = np.array([-np.inf, -7, -1, 0, 1, 7, 30, np.inf])
+DUE_LABELS = ['>1w ago', '1d-1w ago', '<1d ago', '<1d', '1d-1w', '1w-1m',
+              '>1m']
+
+
+class Snapshot(namedtuple('Snapshot',
+                          'ids boards board due complete completed')):
+    """Columns of tracked cards.
+
+    ids are card IDs, board the index of the card board in boards, due
+    and completed epoch seconds (completed is NaN if not observed) and
+    complete the completion flags.
+    """
+
+    @staticmethod
+    def build(tracked, completed):
+        """Build a snapshot from tracked cards and completion times.
+
+        tracked maps card IDs to (board ID, card), completed card IDs to
+        the epoch when their completion was observed.
+        """
+        n = len(tracked)
+        ids = list(tracked)
+        bids = [tracked[i][0] for i in ids]
+        boards, board = np.unique(np.array(bids, dtype=str),
+                                  return_inverse=True)
+        due = np.fromiter((tracked[i][1].due.timestamp() for i in ids),
+                          dtype=np.float64, count=n)
+        complete = np.fromiter((tracked[i][1].dueComplete for i in ids),
+                               dtype=bool, count=n)
+        done = np.fromiter((completed.get(i, np.nan) for i in ids),
+                           dtype=np.float64, count=n)
+        return Snapshot(np.array(ids, dtype=str), boards,
+                        board.astype(np.int32), due, complete, done)
+
+    def save(self, path):
+        """Save the snapshot as compressed .npz, to exactly path."""
+        # NumPy would add .npz to a path without it, not to a file
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **self._asdict())
+
+    @staticmethod
+    def load(path):
+        """Load a snapshot saved with save."""
+        with np.load(path) as data:
+            return Snapshot(**{f: data[f] for f in Snapshot._fields})
+
+    def overdue_by_board(self, now):
+        """Return {board id: count} of incomplete cards past due."""
+        mask = ~self.complete & (self.due < now)
+        counts = np.bincount(self.board[mask], minlength=len(self.boards))
+        return {b: int(c) for b, c in zip(self.boards, counts) if c}
+
+    def due_histogram(self, now):
+        """Return count of incomplete cards in each DUE_BINS interval."""
+        days = (self.due[~self.complete] - now) / 86400
+        counts, _ = np.histogram(days, bins=DUE_BINS)
+        return dict(zip(DUE_LABELS, counts.tolist()))
+
+    def completion_latency(self):
+        """Return statistics on hours from due to observed completion."""
+        hours = (self.completed - self.due) / 3600
+        hours = hours[~np.isnan(hours)]
+        if not hours.size:
+            return None
+        return {
+            'count': int(hours.size),
+            'mean': float(hours.mean()),
+            'median': float(np.median(hours)),
+            'p90': float(np.percentile(hours, 90)),
+        }
+
+    def report(self, now, names=None):
+        """Return a markdown report of the statistics.
+
+        Boards are shown by name if names maps their IDs, else by ID.
+        """
+        names = names or {}
+        lines = [f'*Report* on {len(self.ids)} due dates']
+        lines.append('*Overdue by board*:')
+        for b, c in sorted(self.overdue_by_board(now).items(),
+                           key=lambda bc: -bc[1]):
+            lines.append(f' - {names.get(b, b)}: {c}')
+        lines.append('*Incomplete by due date*:')
+        for label, c in self.due_histogram(now).items():
+            lines.append(f' - {label}: {c}')
+        lat = self.completion_latency()
+        if lat is not None:
+            lines.append(f'*Completed* {lat["count"]} cards, hours from due: '
+                         f'median {lat["median"]:.1f}, '
+                         f'mean {lat["mean"]:.1f}, p90 {lat["p90"]:.1f}')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    ap = argparse.ArgumentParser(description='Report on a snapshot.')
+    ap.add_argument('snapshot', help='Snapshot .npz file')
+    args = ap.parse_args()
+    print(Snapshot.load(args.snapshot).report(time.time()))
@@ -1,18 +1,18 @@
 """Implementation of the actual bot."""
 
-# Telegram bot API
-from telegram.ext import Updater
-from telegram.ext import CommandHandler
-from telegram.ext import CallbackQueryHandler
-
 # Some logging
 import logging
 
-from trellobot.messaging import Messenger
+from trellobot.messaging import Messenger, Digest
 from trellobot.security import security_check
+from trellobot.tracing import span, tracer
+from trellobot.flight import SingleFlight
+from trellobot.search import InvertedIndex
+from trellobot.tracked import NAN, TrackedDues
 from trellobot.trello import TrelloManager
 
-import humanize
+import threading
+import time
 from datetime import datetime
 from datetime import timezone
 
@@ -33,15 +33,45 @@ class TrelloBot:
     """Bot to make Trello perfect."""
 
     check_int = 0.3  # Check interval in minutes
+    digest_window = 30  # Seconds to wait grouping notifications
+    slow_scan = 10  # Seconds after which a scan trace is exported
+    index_descriptions = False  # Make card descriptions searchable too
+
+    def __init__(self, trello_key, trello_secret, trello_token,
+                 clock=aware_now):
+        """Initialize a TrelloBot, reading key files.
 
-    def __init__(self, trello_key, trello_secret, trello_token):
-        """Initialize a TrelloBot, reading key files."""
+        clock is a function returning TZ-aware now, replaced in replays.
+        """
+        self._now = clock
         # Time of last check
-        self.last_check = aware_now()
+        self.last_check = self._now()
+        # Cassette recording traffic, if any
+        self.cassette = None
         # Due dates for registered cards
         self._dues = {}
         # Notification jobs
         self._jobs = {}
+        # Cards with due date seen in last scan, as {id: (board id, card)}
+        self._cards = {}
+        # Due dates of tracked cards as columns, for snapshots
+        self._tracked = TrackedDues()
+        # File where /report saves the snapshot, if any
+        self.snapshot_path = None
+        # Dispatcher running slow handlers in its worker pool, if any
+        self._dispatcher = None
+        # Concurrent scans join the one in flight
+        self._scans = SingleFlight()
+        # Full-text index of cards in scanned boards, grouped by board
+        self._index = InvertedIndex()
+        # Protect jobs, dues and cards from concurrent changes
+        self._lock = threading.RLock()
+        # Pending notifications, by chat id
+        self._digests = {}
+        # Process pool scanning boards, if sharding is enabled
+        self._scanner = None
+        # File where traces of slow scans are exported, if tracing
+        self.trace_path = None
 
         self._trello = TrelloManager(
             api_key=trello_key,
@@ -64,25 +94,52 @@ class TrelloBot:
     #    mattino e una volta alla sera).
     #    """
 
+    def _notify(self, bot, chat_id, text, job_queue):
+        """Enqueue a notification, to be sent in a digest for the chat."""
+        digest = self._digests.get(chat_id)
+        if digest is None:
+            digest = self._digests.setdefault(
+                chat_id, Digest(Messenger.to_chat(bot, chat_id)))
+        # First notification in the window schedules the digest
+        if digest.add(text):
+            job_queue.run_once(self._send_digest,
+                               TrelloBot.digest_window,
+                               context=digest)
+
+    def _send_digest(self, bot, job):
+        """Send notifications collected in a digest."""
+        sent = job.context.flush()
+        logging.debug('Digest sent in %d messages', sent)
+
     def _card_notification(self, bot, job):
         """Notify that a card is due shortly."""
-        ctx, card = job.context
-        when = aware_now() - card.due
-        ctx.send(f'Card {card} due {humanize.naturaltime(when)}')
+        import humanize
+        chat_id, cid = job.context
+        # Job contexts are small, cards are looked up when needed
+        tracked = self._cards.get(cid)
+        if tracked is None:
+            return
+        card = tracked[1]
+        when = self._now() - card.due
+        self._notify(bot, chat_id,
+                     f'Card {card} due {humanize.naturaltime(when)}',
+                     job.job_queue)
 
     def _schedule_due(self, card, ctx, job_queue):
         """Schedule a job for due card, return True if actually enqueued."""
         # We are using time-aware dates, telegram API isn't:
         # convert to delay instead of using directly a datetime
-        delay = (card.due - aware_now()).total_seconds()
+        delay = (card.due - self._now()).total_seconds()
         # If due date is past, we might handle it anyway
         if delay < 0:
             # Notify: you had a non-completed card in the last 24 hours!
             if delay > -3600*24 and not card.dueComplete:
-                logging.debug(f'Non-sched card with recently past due {card}')
-                ctx.send(f'Card was due in the last 24 hours! {card}')
+                logging.debug('Non-sched card with recently past due %s', card)
+                self._notify(ctx.bot, ctx.chat_id,
+                             f'Card was due in the last 24 hours! {card}',
+                             job_queue)
             else:
-                logging.debug(f'Non-sched card with far past due {card}')
+                logging.debug('Non-sched card with far past due %s', card)
             return False
         else:
             # In case of positive delay, we want to notify some time *before*
@@ -90,16 +147,18 @@ class TrelloBot:
             delay -= 3600
             # If there is no time, notify immediately!
             if delay < 0:
-                logging.debug(f'Non-scheduling card due soon {card}')
-                ctx.send(f'Card is due in less than 1 hour! {card}')
+                logging.debug('Non-scheduling card due soon %s', card)
+                self._notify(ctx.bot, ctx.chat_id,
+                             f'Card is due in less than 1 hour! {card}',
+                             job_queue)
                 return False
             else:
-                logging.debug(f'Scheduling card due in future {card}')
+                logging.debug('Scheduling card due in future %s', card)
         # Schedule a notification and save the job for this card
         self._jobs[card.id] = job_queue.run_once(
             self._card_notification,
             when=delay,
-            context=(ctx, card))
+            context=(ctx.chat_id, card.id))
         self._dues[card.id] = card.due  # Save original due date
         return True
 
@@ -110,16 +169,76 @@ class TrelloBot:
 
     def _unschedule_due(self, cid, ctx, job_queue):
         """Unschedule a job previously set for due card."""
-        self._jobs[cid].schedule_removal()
-        del self._jobs[cid]
-        del self._dues[cid]  # Removed associated due date
+        job = self._jobs.pop(cid, None)
+        if job is not None:
+            job.schedule_removal()
+        self._dues.pop(cid, None)  # Removed associated due date
+
+    def shard_scan(self, workers, client_factory=None):
+        """Scan boards with a pool of worker processes, 0 to disable.
+
+        client_factory builds Trello clients in the workers, by default
+        using the same keys of this bot. Requests of the workers are not
+        recorded, so sharding is refused while recording a cassette.
+        """
+        if workers > 0 and self.cassette is not None:
+            raise ValueError('Cannot record sharded scans')
+        if self._scanner is not None:
+            self._scanner.close()
+            self._scanner = None
+        if workers > 0:
+            # Imported here, as process pools are slow to import
+            from trellobot.shard import ShardedScanner
+            if client_factory is None:
+                client_factory = self._trello.client_factory()
+            self._scanner = ShardedScanner(client_factory, workers)
+
+    def _update_due(self, bid, ctx, jq, cards=None):
+        """Update due dates for given board, fetching cards if not given."""
+        with span('_update_due', board=bid):
+            if cards is None:
+                with span('fetch_cards', board=bid):
+                    cards = list(self._trello.fetch_cards(
+                        bid=bid, checkitems=True))
+            with span('schedule', cards=len(cards)), self._lock:
+                count, scanned = self._apply_cards(cards, ctx, jq)
+                self._track_cards(bid, cards)
+            with span('index', cards=len(cards)):
+                self._index.sync(bid, ((c.id, self._index_text(c), c)
+                                       for c in cards))
+        return count, scanned
 
-    def _update_due(self, bid, ctx, jq):
-        """Update due dates for given board."""
+    def _index_text(self, card):
+        """Return the searchable text of a card or check item."""
+        if TrelloBot.index_descriptions and getattr(card, 'desc', ''):
+            return f'{card.name}\n{card.desc}'
+        return card.name
+
+    def _track_cards(self, bid, cards):
+        """Keep cards with due date and observe their completion."""
+        now = self._now().timestamp()
+        for c in cards:
+            if c.due is None:
+                self._cards.pop(c.id, None)
+                self._tracked.remove(c.id)
+                continue
+            old = self._cards.get(c.id)
+            completed = NAN
+            if c.dueComplete:
+                completed = self._tracked.completed_at(c.id)
+                if old is not None and not old[1].dueComplete:
+                    # Completed since last scan
+                    completed = now
+            self._cards[c.id] = (bid, c)
+            self._tracked.set(c.id, bid, c.due.timestamp(), c.dueComplete,
+                              completed)
+
+    def _apply_cards(self, cards, ctx, jq):
+        """Schedule, reschedule or unschedule due dates for the cards."""
         # Iterate cards in board and add to due dates
         count = Counter()
         scanned = set()  # IDs of scanned cards
-        for c in self._trello.fetch_cards(bid=bid):
+        for c in cards:
             scanned.add(c.id)
             # Card has no due date set
             if c.due is None:
@@ -163,29 +282,96 @@ class TrelloBot:
                         count['rescheduled'] += 1
         return count, scanned
 
-    def _check_due(self, bot, ctx, job_queue):
-        """Rebuild the dictionary of due dates."""
+    def _fetch_board_cards(self):
+        """Generate (board id, cards) for every whitelisted board."""
+        if self._scanner is not None:
+            bids = [b.id for b in self._trello.list_boards()
+                    if not b.blacklisted]
+            # Workers make the same requests of the board plan
+            self._record_scan('board')
+            # Cards are fetched by workers, scheduling happens here
+            return self._scanner.scan(bids)
+        # Cards are fetched with the cheapest plan
+        fetched = self._trello.fetch_board_cards()
+        self._record_scan(self._trello.plan)
+        return fetched
+
+    def _record_scan(self, plan):
+        """Record plan and whitelist of a scan, to pin them in replays."""
+        if self.cassette is not None:
+            whitelist = sorted(self._trello.whitelisted_brds())
+            self.cassette.add('scan', plan=plan, whitelist=whitelist)
+
+    def _check_due(self, bot, ctx, job_queue, progress=None):
+        """Rebuild the dictionary of due dates.
+
+        progress is called with board ID and counts after each board.
+        """
         # Iterate all the boards
         count = Counter()
         scanned = set()
-        for b in self._trello.fetch_boards():
-            if not b.blacklisted:
-                c, s = self._update_due(b.id, ctx, job_queue)
-                count += c
-                scanned.update(s)
+        boards = set()
+        for bid, cards in self._fetch_board_cards():
+            c, s = self._update_due(bid, ctx, job_queue, cards)
+            count += c
+            scanned.update(s)
+            boards.add(bid)
+            if progress is not None:
+                progress(bid, count)
+        # Forget cards of boards no longer scanned
+        self._index.retain(boards)
         # Check for removed cards (TODO get notifications from trello?)
-        saved = set(self._dues.keys())
-        for cid in saved - scanned:
-            self._unschedule_due(cid, ctx, job_queue)
-            count['deleted'] += 1
+        with span('unschedule_deleted'), self._lock:
+            saved = set(self._dues.keys())
+            for cid in saved - scanned:
+                self._unschedule_due(cid, ctx, job_queue)
+                count['deleted'] += 1
+            for cid in set(self._cards) - scanned:
+                del self._cards[cid]
+                self._tracked.remove(cid)
         # Return counter
         return count
 
+    def _traced_check_due(self, bot, ctx, job_queue, progress=None):
+        """Check due dates, exporting the trace if scan is slow."""
+        start = tracer.clock()
+        with span('_check_due'):
+            count = self._check_due(bot, ctx, job_queue, progress)
+        elapsed = (tracer.clock() - start) / 1e6
+        if tracer.enabled and self.trace_path and elapsed > self.slow_scan:
+            n = tracer.export(self.trace_path, since=start)
+            logging.warning('Scan took %.1fs, %d spans exported to %s',
+                            elapsed, n, self.trace_path)
+        return count
+
+    def _scan(self, bot, ctx, job_queue):
+        """Check due dates, or join the scan already in flight."""
+        if self._scans.in_flight('scan'):
+            logging.info('Joining scan in flight')
+        return self._scans.do('scan', self._traced_check_due,
+                              bot, ctx, job_queue)
+
+    def _run_async(self, func, *args, **kwargs):
+        """Run func in the dispatcher worker pool, if any, else now."""
+        if self._dispatcher is None:
+            return func(*args, **kwargs)
+        return self._dispatcher.run_async(func, *args, **kwargs)
+
+    def _async_handler(self, callback):
+        """Wrap a slow handler to run off the dispatch path."""
+        def handler(bot, update, **kwargs):
+            self._run_async(callback, bot, update, **kwargs)
+        return handler
+
     def check_updates(self, bot, job):
         """Check if new threads are present since last check."""
         logging.info('JOB: checking updates')
-        update, job_queue = job.context
-        self.rescan_updates(bot, update, job_queue)
+        # Waiting for the scan in flight would only take up a worker
+        if self._scans.in_flight('scan'):
+            logging.info('Scan in flight, skipping periodic check')
+            return
+        # Do not block other jobs (e.g. notifications) while scanning
+        self._run_async(self._rescan, bot, job.context, job.job_queue)
 
     def _report(self, count):
         """Produce a report regarding count."""
@@ -193,11 +379,47 @@ class TrelloBot:
 
     def rescan_updates(self, bot, update, job_queue):
         """Rescan cards tracking due dates."""
-        with Messenger(bot, update, 'Scanning for updates...') as msg:
+        self._rescan(bot, update.message.chat_id, job_queue)
+
+    def _rescan(self, bot, chat_id, job_queue):
+        """Rescan cards tracking due dates, reporting to chat."""
+        with Messenger.to_chat(bot, chat_id,
+                               'Scanning for updates...') as msg:
             # Get data, caching them
-            count = self._check_due(bot, msg, job_queue)
+            count = self._scan(bot, msg, job_queue)
             # n = len(list(self._trello.fetch_data()))
-            msg.override(f'Done. ' + self._report(count))
+            plan = 'sharded' if self._scanner else self._trello.plan
+            msg.override(f'Done ({plan} plan). ' + self._report(count))
+
+    def snapshot(self):
+        """Return a columnar snapshot of the tracked cards."""
+        with self._lock:
+            return self._tracked.snapshot()
+
+    def report_stats(self, bot, update):
+        """Send statistics about tracked due dates."""
+        logging.info('Requested /report')
+        for ctx in security_check(bot, update):
+            snap = self.snapshot()
+            if self.snapshot_path:
+                snap.save(self.snapshot_path)
+            names = {b.id: b.name for b in self._trello.boards.values()}
+            ctx.send(snap.report(self._now().timestamp(), names))
+
+    def find(self, bot, update):
+        """Search cards by name, in the boards scanned so far."""
+        logging.info('Requested /find')
+        for ctx in security_check(bot, update):
+            query = update.message.text.partition(' ')[2].strip()
+            if not query:
+                ctx.send('What should I find? Use `/find some words`')
+                return
+            results = self._index.search(query)
+            if not results:
+                # The query may contain markdown, e.g. foo_bar
+                ctx.send(f'No cards found for "{query}"', markdown=False)
+                return
+            ctx.send('*Found*:' + ''.join(f'\n - {c}' for _, c in results))
 
     def daily_report(self, bot, job):
         """Send a daily report about tasks."""
@@ -292,7 +514,7 @@ class TrelloBot:
                 # Show upcoming cards
                 for dd in self._dues:
                     # Past dues in a separated list
-                    if dd < aware_now():
+                    if dd < self._now():
                         for c in self._dues[dd]:
                             pem.append(f'\n - {c}')
                     else:
@@ -306,7 +528,7 @@ class TrelloBot:
                 # Show upcoming cards
                 for dd in self._dues:
                     # Skip past due
-                    if dd.date() != aware_now().date():
+                    if dd.date() != self._now().date():
                         continue
                     for c in self._dues[dd]:
                         em.append(f'\n - {c}')
@@ -325,6 +547,33 @@ class TrelloBot:
                 ]
             )
 
+    def _initial_scan(self, bot, job):
+        """Scan boards after /start, streaming results as they come."""
+        ctx = Messenger.to_chat(bot, job.context)
+        # Scans requested meanwhile join this one
+        self._scans.do('scan', self._stream_scan, bot, ctx, job.job_queue)
+
+    def _stream_scan(self, bot, ctx, job_queue):
+        """Scan boards, listing them and their status while scanning."""
+        t0 = time.perf_counter()
+        abm, bbm = '*Allowed boards*', '*Not allowed boards*'
+        with ctx.spawn(abm) as aem, ctx.spawn(bbm) as bem:
+            with ctx.spawn('*Status*: fetching data') as stm:
+                def progress(bid, count):
+                    # Called after cards of the board are scheduled
+                    aem.append(f'\n - {self._trello.boards[bid]} {bid}')
+                    stm.override('*Status*: fetching data. '
+                                 + self._report(count))
+                count = self._traced_check_due(bot, ctx, job_queue,
+                                               progress)
+                for b in self._trello.boards.values():
+                    if b.blacklisted:
+                        bem.append(f'\n - {b} {b.id}')
+                stm.override('*Status*: Done. ' + self._report(count))
+        logging.info('Initial scan completed in %.3fs',
+                     time.perf_counter() - t0)
+        return count
+
     def start(self, bot, update, job_queue):
         """Start the bot, schedule tasks and printing welcome message."""
         logging.info(f'Requested /start from user {update.message.chat_id}')
@@ -337,29 +586,16 @@ class TrelloBot:
                 f'*Welcome!*\n'
                 f'TrelloBot will now make your life better. ',
             )
-
-            # List boards, blacklisted and not
-            count = Counter()
-            abm, bbm = '*Allowed boards*', '*Not allowed boards*'
-            with ctx.spawn(abm) as aem, ctx.spawn(bbm) as bem:
-                with ctx.spawn('*Status*: fetching data') as stm:
-                    for b in self._trello.fetch_boards():
-                        if b.blacklisted:
-                            bem.append(f'\n - {b} {b.id}')
-                        else:
-                            c, _ = self._update_due(b.id, ctx, job_queue)
-                            count += c  # Keep stats
-                            aem.append(f'\n - {b} {b.id}')
-                    stm.override(f'*Status*: Done. ' + self._report(count))
-
             ctx.send(f'Refreshing every {TrelloBot.check_int} mins')
 
             # Start repeated job
             job_queue.run_repeating(
                 self.check_updates,
                 TrelloBot.check_int * 60.0,
-                context=(update, job_queue),
+                context=ctx.chat_id,
             )
+            # Scan boards in background, without blocking the welcome
+            job_queue.run_once(self._initial_scan, 0, context=ctx.chat_id)
             self.started = True
 
     def buttons(self, bot, update):
@@ -393,12 +629,27 @@ class TrelloBot:
         #
         # )
 
-    def run_bot(self, bot_key):
-        """Start the bot, register handlers, etc."""
+    def run_bot(self, bot_key, workers=4, webhook=None, webhook_url=None):
+        """Start the bot, register handlers, etc.
+
+        Updates are polled, unless webhook is a (host, port) tuple: then
+        they are received by a local listener, registering webhook_url
+        with Telegram if given. Handlers run in a pool of workers.
+        """
+        # Telegram bot API, imported here to keep startup fast
+        from telegram.ext import Updater
+        from telegram.ext import CommandHandler
+        from telegram.ext import CallbackQueryHandler
+
         # Setup bot
-        updater = Updater(token=bot_key)
+        updater = Updater(token=bot_key, workers=workers)
 
         disp = updater.dispatcher
+        self._dispatcher = disp
+
+        # Record outgoing messages, if requested
+        if self.cassette is not None:
+            self.cassette.wrap_bot(updater.bot)
 
         # Handler for buttons
         disp.add_handler(CallbackQueryHandler(self.buttons))
@@ -406,9 +657,14 @@ class TrelloBot:
                                         self.start,
                                         pass_job_queue=True))
         disp.add_handler(CommandHandler('update',
-                                        self.rescan_updates,
+                                        self._async_handler(
+                                            self.rescan_updates),
                                         pass_job_queue=True))
         # disp.add_handler(CommandHandler('ls', self.ls))
+        disp.add_handler(CommandHandler('find', self.find))
+        disp.add_handler(CommandHandler('report',
+                                        self._async_handler(
+                                            self.report_stats)))
         # Blacklist management
         disp.add_handler(CommandHandler('wlo', self.wl_org))
         disp.add_handler(CommandHandler('blo', self.bl_org))
@@ -419,4 +675,16 @@ class TrelloBot:
         # disp.add_handler(CommandHandler(['today', 'tod', 't'],
         #                                self.today_due))
 
-        updater.start_polling()
+        if webhook is None:
+            updater.start_polling()
+        else:
+            from trellobot.webhook import WebhookListener
+            host, port = webhook
+            listener = WebhookListener(updater.bot, disp.update_queue,
+                                       host, port, f'/{bot_key}')
+            if webhook_url is not None:
+                updater.bot.set_webhook(url=f'{webhook_url}/{bot_key}')
+            # Start what start_polling would start
+            updater.job_queue.start()
+            threading.Thread(target=disp.start, name='dispatcher').start()
+            listener.start()
@@ -0,0 +1,342 @@
+"""Record and replay Trello and Telegram traffic.
+
+A cassette is a JSON-lines file: each line is an event, either a Trello
+response ('trello') or an outgoing Telegram call ('telegram'), stamped
+with the epoch time it happened. Recording wraps the live clients, while
+replaying drives a TrelloBot from the cassette with a simulated clock:
+
+    python -m trellobot.cassette traffic.jsonl
+"""
+
+
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+import trellobot.security as sec
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from functools import partial
+from trellobot.bot import TrelloBot
+from trellobot.trello import TrelloManager
+from types import SimpleNamespace
+
+
+def _key(path, query_params):
+    """Build the key used to match a Trello request."""
+    return json.dumps([path, query_params or {}], sort_keys=True)
+
+
+class Cassette:
+    """A sequence of recorded events, optionally appended to a file."""
+
+    def __init__(self, path=None, events=None):
+        """Create a cassette, writing new events to path if given."""
+        self.events = list(events or [])
+        self._file = open(path, 'at') if path is not None else None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load(path):
+        """Load a cassette from file, for replaying."""
+        with open(path) as f:
+            return Cassette(events=[json.loads(ln) for ln in f if ln.strip()])
+
+    def add(self, kind, **data):
+        """Record a new event, happening now."""
+        event = dict(data, kind=kind, t=time.time())
+        with self._lock:
+            self.events.append(event)
+            if self._file is not None:
+                self._file.write(json.dumps(event) + '\n')
+                self._file.flush()
+
+    def wrap_bot(self, bot):
+        """Record messages sent and edited by a telegram Bot."""
+        send, edit = bot.send_message, bot.editMessageText
+
+        def send_message(**kwargs):
+            msg = send(**kwargs)
+            self.add('telegram', method='send_message',
+                     chat_id=kwargs.get('chat_id'), text=kwargs.get('text'))
+            return msg
+
+        def edit_message_text(**kwargs):
+            msg = edit(**kwargs)
+            self.add('telegram', method='editMessageText',
+                     chat_id=kwargs.get('chat_id'), text=kwargs.get('text'))
+            return msg
+
+        bot.send_message = send_message
+        bot.editMessageText = edit_message_text
+        return bot
+
+    def stats(self):
+        """Count events by kind and method."""
+        count = Counter()
+        for e in self.events:
+            count[e.get('method', e['kind'])] += 1
+        return count
+
+
+class RecordingClient:
+    """Wrap a TrelloClient, recording responses of fetch_json."""
+
+    def __init__(self, client, cassette):
+        """Record responses of client into cassette."""
+        self._client = client
+        self._cassette = cassette
+
+    def fetch_json(self, uri_path, query_params=None, **kwargs):
+        """Fetch JSON from Trello and record it."""
+        data = self._client.fetch_json(uri_path, query_params=query_params,
+                                       **kwargs)
+        self._cassette.add('trello', path=uri_path,
+                           params=query_params or {}, response=data)
+        return data
+
+
+class ReplayClient:
+    """Serve fetch_json from a cassette, following a simulated clock.
+
+    Each request gets the latest response recorded for it before the
+    current simulated time, or the earliest one if none was recorded yet.
+    """
+
+    def __init__(self, cassette, clock):
+        """Prepare responses from the cassette."""
+        self._clock = clock
+        self._responses = defaultdict(list)
+        for e in cassette.events:
+            if e['kind'] == 'trello':
+                key = _key(e['path'], e['params'])
+                self._responses[key].append((e['t'], e['response']))
+        self.calls = Counter()
+
+    def fetch_json(self, uri_path, query_params=None, **kwargs):
+        """Return the recorded response for this request."""
+        key = _key(uri_path, query_params)
+        self.calls[uri_path] += 1
+        if key not in self._responses:
+            raise KeyError(f'No recorded response for {uri_path}')
+        now = self._clock.time()
+        responses = self._responses[key]
+        data = responses[0][1]
+        for t, r in responses:
+            if t > now:
+                break
+            data = r
+        # Callers may change the data, do not hand out the recording
+        return json.loads(json.dumps(data))
+
+
+class SimClock:
+    """A clock that moves only when told to."""
+
+    def __init__(self, start):
+        """Start the clock at given epoch time."""
+        self._t = start
+
+    def time(self):
+        """Return current epoch time."""
+        return self._t
+
+    def now(self):
+        """Return current TZ-aware datetime, like aware_now."""
+        return datetime.fromtimestamp(self._t, timezone.utc)
+
+    def set(self, t):
+        """Move the clock to epoch time t (never backwards)."""
+        self._t = max(self._t, t)
+
+
+class SimJob:
+    """A job in a SimJobQueue, compatible with telegram.ext.Job."""
+
+    def __init__(self, callback, interval, repeat, context, job_queue):
+        """Create a job, see telegram.ext.Job."""
+        self.callback = callback
+        self.interval = interval
+        self.repeat = repeat
+        self.context = context
+        self.job_queue = job_queue
+        self.removed = False
+
+    def schedule_removal(self):
+        """Mark the job for removal."""
+        self.removed = True
+
+
+class SimJobQueue:
+    """A job queue running jobs on a simulated clock, without threads."""
+
+    def __init__(self, clock, bot=None, keep_timings=True):
+        """Create a job queue following clock, passing bot to jobs.
+
+        Durations of jobs are kept in timings, unless keep_timings is
+        False (e.g. for long simulations).
+        """
+        self._clock = clock
+        self._bot = bot
+        self._queue = []
+        self._seq = itertools.count()  # Ties are broken in FIFO order
+        self._keep_timings = keep_timings
+        self.runs = Counter()
+        self.timings = defaultdict(list)
+
+    def _put(self, job, when):
+        heapq.heappush(self._queue, (when, next(self._seq), job))
+
+    def run_once(self, callback, when, context=None):
+        """Run callback once, in when seconds."""
+        job = SimJob(callback, None, False, context, self)
+        self._put(job, self._clock.time() + when)
+        return job
+
+    def run_repeating(self, callback, interval, first=None, context=None):
+        """Run callback every interval seconds."""
+        job = SimJob(callback, interval, True, context, self)
+        first = interval if first is None else first
+        self._put(job, self._clock.time() + first)
+        return job
+
+    def __len__(self):
+        """Return number of pending jobs."""
+        return sum(not j.removed for _, _, j in self._queue)
+
+    def run_until(self, t):
+        """Run all jobs due before epoch time t, moving the clock."""
+        while self._queue and self._queue[0][0] <= t:
+            when, _, job = heapq.heappop(self._queue)
+            if job.removed:
+                continue
+            self._clock.set(when)
+            name = getattr(job.callback, '__name__', repr(job.callback))
+            t0 = time.perf_counter()
+            job.callback(self._bot, job)
+            if self._keep_timings:
+                self.timings[name].append(time.perf_counter() - t0)
+            self.runs[name] += 1
+            if job.repeat and not job.removed:
+                self._put(job, when + job.interval)
+        self._clock.set(t)
+
+
+class FakeBot:
+    """A telegram Bot collecting outgoing messages."""
+
+    def __init__(self, keep=True):
+        """Create a bot with no messages, keeping them only if keep."""
+        self.sent = []
+        self.edited = []
+        self.count = Counter()
+        self._keep = keep
+        self._ids = itertools.count(1)
+
+    def send_message(self, **kwargs):
+        """Collect a message."""
+        self.count['send_message'] += 1
+        if self._keep:
+            self.sent.append(kwargs)
+        return SimpleNamespace(message_id=next(self._ids))
+
+    def editMessageText(self, **kwargs):
+        """Collect an edit."""
+        self.count['editMessageText'] += 1
+        if self._keep:
+            self.edited.append(kwargs)
+        return SimpleNamespace(message_id=kwargs.get('message_id'))
+
+
+def _recorded_plan(scans, clock, trello):
+    """Pin the whitelist of the recorded scan happening now, return its plan.
+
+    A scan is recorded once it started, so the scan happening now is the
+    first recorded from now on (or the last one, past the recording).
+    """
+    i = bisect_left([e['t'] for e in scans], clock.time())
+    scan = scans[min(i, len(scans) - 1)]
+    for bid in trello.whitelisted_brds() - set(scan['whitelist']):
+        trello.blacklist_brd(bid)
+    for bid in scan['whitelist']:
+        trello.whitelist_brd(bid)
+    return scan['plan']
+
+
+def replay(cassette, duration=None, bot=None):
+    """Drive a TrelloBot from a cassette, return stats on its traffic.
+
+    Plans and whitelists of the recorded scans are used by the replayed
+    ones (for older cassettes, boards fetched are whitelisted). The bot is
+    started by the recorded chat at the time of the first event. Messages
+    are sent to bot, a new FakeBot if not specified.
+    """
+    if not cassette.events:
+        raise ValueError('Cannot replay an empty cassette')
+    start = min(e['t'] for e in cassette.events)
+    end = max(e['t'] for e in cassette.events)
+    if duration is not None:
+        end = start + duration
+
+    clock = SimClock(start)
+    client = ReplayClient(cassette, clock)
+    bot = FakeBot() if bot is None else bot
+    jq = SimJobQueue(clock, bot)
+
+    tb = TrelloBot(None, None, None, clock=clock.now)
+    tb._trello = TrelloManager(None, None, None, client=client)
+    scans = [e for e in cassette.events if e['kind'] == 'scan']
+    if scans:
+        # Replayed requests must match the recorded ones
+        tb._trello.pinned_plan = partial(_recorded_plan, scans, clock,
+                                         tb._trello)
+    else:
+        # Only use the account plan if it was recorded
+        tb._trello.planner.account_supported = any(
+            e['kind'] == 'trello' and e['params'].get('cards')
+            for e in cassette.events)
+    chat_id = None
+    for e in cassette.events:
+        if e['kind'] == 'trello' and e['path'].startswith('/boards/') \
+                and not scans:
+            tb._trello.whitelist_brd(e['path'].split('/')[2])
+        elif e['kind'] == 'telegram' and chat_id is None:
+            chat_id = e['chat_id']
+
+    update = SimpleNamespace(message=SimpleNamespace(chat_id=chat_id))
+    authorized, sec.authorized_user = sec.authorized_user, chat_id
+    try:
+        t0 = time.perf_counter()
+        tb.start(bot, update, jq)
+        jq.run_until(end)
+        elapsed = time.perf_counter() - t0
+    finally:
+        sec.authorized_user = authorized
+
+    scans = jq.timings['check_updates'] + jq.timings['_initial_scan']
+    return {
+        'simulated_seconds': end - start,
+        'elapsed_seconds': elapsed,
+        'trello_calls': sum(client.calls.values()),
+        'send_message': bot.count['send_message'],
+        'editMessageText': bot.count['editMessageText'],
+        'scans': len(scans),
+        'scan_seconds_total': sum(scans),
+        'scan_seconds_max': max(scans, default=0),
+        'recorded': dict(cassette.stats()),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    ap = argparse.ArgumentParser(description='Replay a cassette.')
+    ap.add_argument('cassette', help='Cassette file to replay')
+    ap.add_argument('--duration', type=float,
+                    help='Seconds to simulate (default: whole cassette)')
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    stats = replay(Cassette.load(args.cassette), args.duration)
+    print(json.dumps(stats, indent=2))
@@ -28,8 +28,8 @@ class List(namedtuple('List', 'id name url')):
         return f'[{self.name}]({self.url})'
 
 
-class Card(namedtuple('Card', 'id name url due dueComplete')):
-    """A Trello card."""
+class Card(namedtuple('Card', 'id name url due dueComplete desc')):
+    """A Trello card, desc is empty if not given."""
 
     def __str__(self):
         """Card to string, markdown formatted."""
@@ -37,3 +37,15 @@ class Card(namedtuple('Card', 'id name url due dueComplete')):
             return f'[\u2611](/unmark {self.id}) [{self.name}]({self.url})'
         else:
             return f'[\u2610](/mark {self.id}) [{self.name}]({self.url})'
+
+
+Card.__new__.__defaults__ = ('',)
+
+
+class CheckItem(namedtuple('CheckItem', 'id name url due dueComplete idCard')):
+    """A Trello checklist item with a due date, url is the card one."""
+
+    def __str__(self):
+        """Check item to string, markdown formatted."""
+        box = '\u2611' if self.dueComplete else '\u2610'
+        return f'{box} [{self.name}]({self.url})'
@@ -0,0 +1,60 @@
+"""Collapse concurrent identical calls into a single one.
+
+While a call for a key is in flight, other calls for the same key wait
+for it and share its result (or exception), instead of running again.
+"""
+
+
+import threading
+
+
+class _Call:
+    """A call in flight."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.joined = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time, sharing results."""
+
+    def __init__(self):
+        """Create a group with no calls in flight."""
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.joined = 0  # Calls that did not run, sharing a result
+
+    def in_flight(self, key):
+        """Return True if a call for key is running."""
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func, or wait for the call in flight with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.joined += 1
+                self.joined += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
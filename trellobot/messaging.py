@@ -2,13 +2,15 @@
 
 
 import logging
-from telegram import ParseMode, InlineKeyboardButton, InlineKeyboardMarkup
+import threading
+from trellobot.tracing import span
 
 
 class Messenger:
     """Send a message and give a chance to edit it."""
 
-    parse_modes = {'md': ParseMode.MARKDOWN, 'html': ParseMode.HTML}
+    # Values of telegram.ParseMode, not imported to keep startup fast
+    parse_modes = {'md': 'Markdown', 'html': 'HTML'}
 
     @staticmethod
     def from_message(bot, update, msg_handler, parse_mode='md', bufsize=0):
@@ -23,11 +25,23 @@ class Messenger:
         return Messenger.from_message(bot, query, query.message,
                                       parse_mode, bufsize)
 
-    def __init__(self, bot, update, message=None, parse_mode='md', bufsize=8):
-        """Create a new context for messaging."""
+    @staticmethod
+    def to_chat(bot, chat_id, message=None, parse_mode='md'):
+        """Build a new Messenger for a chat, without keeping any update."""
+        return Messenger(bot, None, message, parse_mode, chat_id=chat_id)
+
+    def __init__(self, bot, update, message=None, parse_mode='md', bufsize=8,
+                 chat_id=None):
+        """Create a new context for messaging.
+
+        Messages go to the chat of update, or to chat_id if given.
+        """
         logging.debug('Creating a Messenger')
         self.bot = bot
         self.update = update
+        if chat_id is None:
+            chat_id = update.message.chat_id
+        self.chat_id = chat_id
         self._mode = parse_mode
         self._bufcap = bufsize  # How many edits to store before sending
         self._bufcount = 0  # How many edits are waiting to be sent
@@ -40,11 +54,13 @@ class Messenger:
 
     def spawn(self, message=None, bufsize=8):
         """Spawn a new messenger with same bot, update and parse mode."""
-        return Messenger(self.bot, self.update, message, self._mode)
+        return Messenger(self.bot, self.update, message, self._mode,
+                         chat_id=self.chat_id)
 
     def _make_keyboard(self, keyboard):
         """Build a keyboard markup."""
         if keyboard is not None:
+            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
             rows = []
             for row in keyboard:
                 keys = []
@@ -58,25 +74,31 @@ class Messenger:
     def _edit_text(self, text, keyboard=None):
         """Send current text as editing text, markdown or html."""
         keyboard = self._make_keyboard(keyboard)
-        self._msg = self.bot.editMessageText(
-            text=text,
-            chat_id=self.update.message.chat_id,
-            message_id=self._msg.message_id,
-            parse_mode=Messenger.parse_modes.get(self._mode),
-            reply_markup=keyboard,
-        )
-
-    def send(self, msg, keyboard=None):
-        """Send a text message immediately, with optional keyboard."""
-        logging.info(f'Sending message {msg} with mode {self._mode}')
+        with span('editMessageText', length=len(text)):
+            self._msg = self.bot.editMessageText(
+                text=text,
+                chat_id=self.chat_id,
+                message_id=self._msg.message_id,
+                parse_mode=Messenger.parse_modes.get(self._mode),
+                reply_markup=keyboard,
+            )
+
+    def send(self, msg, keyboard=None, markdown=True):
+        """Send a text message immediately, with optional keyboard.
+
+        If markdown is False, the message is sent as plain text.
+        """
+        mode = self._mode if markdown else None
+        logging.info('Sending message %s with mode %s', msg, mode)
         keyboard = self._make_keyboard(keyboard)
         # Send formatted message with markup
-        return self.bot.send_message(
-            chat_id=self.update.message.chat_id,
-            text=msg,
-            parse_mode=Messenger.parse_modes.get(self._mode),
-            reply_markup=keyboard,
-        )
+        with span('send_message', length=len(msg)):
+            return self.bot.send_message(
+                chat_id=self.chat_id,
+                text=msg,
+                parse_mode=Messenger.parse_modes.get(mode),
+                reply_markup=keyboard,
+            )
 
     def flush(self):
         """Send content of the buffer immediately."""
@@ -112,3 +134,78 @@ class Messenger:
         """Do nothing."""
         # Ensure buffer is flushed
         self.flush()
+
+
+class Digest:
+    """Collect notification lines for a chat and send them grouped."""
+
+    max_length = 4096  # Telegram limit on message length
+
+    def __init__(self, ctx, title='*Notifications*'):
+        """Create a digest sending with the given Messenger."""
+        self._ctx = ctx
+        self._title = title
+        self._lines = []
+        self._lock = threading.Lock()
+
+    def add(self, line):
+        """Add a line to the digest, return True if it was empty."""
+        with self._lock:
+            self._lines.append(line)
+            return len(self._lines) == 1
+
+    def _chunks(self, lines):
+        """Pack lines in lists fitting a message of max_length.
+
+        Lines are never cut, not to break their markdown: a line too long
+        is alone in its list.
+        """
+        chunk, length = [], len(self._title)
+        for line in lines:
+            if chunk and length + 1 + len(line) > self.max_length:
+                yield chunk
+                chunk, length = [], len(self._title)
+            chunk.append(line)
+            length += 1 + len(line)
+        if chunk:
+            yield chunk
+
+    def _send_lines(self, lines):
+        """Send lines one by one, as plain text if rejected, return sent."""
+        sent = 0
+        for line in lines:
+            try:
+                self._ctx.send(line)
+            except Exception:
+                # Likely bad markdown, e.g. from a card name
+                logging.warning('Cannot send %r, retrying as plain text',
+                                line, exc_info=True)
+                try:
+                    self._ctx.send(line[:self.max_length], markdown=False)
+                except Exception:
+                    logging.exception('Notification lost: %r', line)
+                    continue
+            sent += 1
+        return sent
+
+    def flush(self):
+        """Send all the collected lines, return number of messages sent."""
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if not lines:
+            return 0
+        sent = 0
+        for chunk in self._chunks(lines):
+            # A lone notification is sent as is
+            if len(chunk) == 1:
+                sent += self._send_lines(chunk)
+                continue
+            try:
+                self._ctx.send('\n'.join([self._title] + chunk))
+                sent += 1
+            except Exception:
+                # Do not lose the whole chunk for a bad line
+                logging.warning('Cannot send digest, sending %d lines '
+                                'one by one', len(chunk), exc_info=True)
+                sent += self._send_lines(chunk)
+        return sent
@@ -0,0 +1,79 @@
+"""Choose how to fetch cards of whitelisted boards.
+
+Cards can be fetched with one request per whitelisted board ('board'
+plan), or with a single request returning all the boards of the account
+with their cards nested ('account' plan). The cost of a request is
+modelled as latency = overhead + per_card * cards, fitted on the
+requests observed so far, and board sizes are remembered between scans.
+"""
+
+
+class FetchPlanner:
+    """Estimate request costs and pick the cheapest plan."""
+
+    decay = 0.95  # Weight of past observations at each new one
+    default_size = 20  # Cards assumed in a board never seen
+
+    def __init__(self, overhead=0.3, per_card=0.002):
+        """Create a planner, with prior estimates of the cost model."""
+        # Decayed sums for least squares fit of latency over cards,
+        # seeded with two pseudo-observations of the prior model
+        self._n = self._sx = self._sy = self._sxx = self._sxy = 0.0
+        for cards in (0, 100):
+            self.observe(cards, overhead + per_card * cards)
+        # Cards in each board, as seen in latest fetch
+        self.sizes = {}
+        # Whether the account plan returned nested cards
+        self.account_supported = True
+
+    def observe(self, cards, seconds):
+        """Record a request returning some cards in given seconds."""
+        d = self.decay
+        self._n = self._n * d + 1
+        self._sx = self._sx * d + cards
+        self._sy = self._sy * d + seconds
+        self._sxx = self._sxx * d + cards * cards
+        self._sxy = self._sxy * d + cards * seconds
+
+    def model(self):
+        """Return (overhead, per_card) estimates, in seconds."""
+        mx, my = self._sx / self._n, self._sy / self._n
+        var = self._sxx / self._n - mx * mx
+        if var <= 1e-9:
+            return my, 0.0
+        per_card = max(0.0, (self._sxy / self._n - mx * my) / var)
+        overhead = max(0.0, my - per_card * mx)
+        return overhead, per_card
+
+    def forget(self, boards):
+        """Forget sizes of boards not in boards."""
+        boards = set(boards)
+        self.sizes = {b: s for b, s in self.sizes.items() if b in boards}
+
+    def _size(self, bid):
+        """Return estimated number of cards in a board."""
+        if bid in self.sizes:
+            return self.sizes[bid]
+        if self.sizes:
+            return sum(self.sizes.values()) / len(self.sizes)
+        return self.default_size
+
+    def costs(self, whitelisted, boards):
+        """Estimate seconds spent by each plan, return a dictionary.
+
+        Both plans list boards, the board plan with a request without
+        cards before fetching cards of whitelisted boards one by one.
+        """
+        overhead, per_card = self.model()
+        board_plan = overhead + sum(overhead + per_card * self._size(b)
+                                    for b in whitelisted)
+        account_plan = overhead + per_card * sum(self._size(b)
+                                                 for b in boards)
+        return {'board': board_plan, 'account': account_plan}
+
+    def choose(self, whitelisted, boards):
+        """Return the name of the cheapest plan."""
+        if not self.account_supported:
+            return 'board'
+        costs = self.costs(whitelisted, boards)
+        return min(costs, key=costs.get)
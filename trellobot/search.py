@@ -0,0 +1,142 @@
+"""In-memory full-text index over cards.
+
+Documents are grouped (by board): syncing a group updates the documents
+whose text changed and drops the ones no longer present, so the index can
+be refreshed at each scan without rebuilding it.
+"""
+
+
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+
+def tokenize(text):
+    """Split text in lowercase words."""
+    return re.findall(r'\w+', text.lower())
+
+
+class InvertedIndex:
+    """Rank documents matching all the words of a query."""
+
+    k1 = 1.2  # BM25 term frequency saturation
+    b = 0.75  # BM25 length normalization
+
+    def __init__(self):
+        """Create an empty index."""
+        self._lock = threading.Lock()
+        self._postings = {}  # token -> {doc id: term frequency}
+        self._docs = {}  # doc id -> (text, length, group)
+        self._payloads = {}  # doc id -> object returned by search
+        self._groups = {}  # group -> set of doc ids
+        self._total = 0  # Sum of documents lengths
+        self._vocab = None  # Sorted tokens, for prefix search
+
+    def __len__(self):
+        """Return number of indexed documents."""
+        return len(self._docs)
+
+    def _add(self, did, text, group, payload):
+        tf = Counter(tokenize(text))
+        for token, n in tf.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._vocab = None
+            self._postings[token][did] = n
+        length = sum(tf.values())
+        self._docs[did] = (text, length, group)
+        self._payloads[did] = payload
+        self._groups.setdefault(group, set()).add(did)
+        self._total += length
+
+    def _remove(self, did):
+        text, length, group = self._docs.pop(did)
+        for token in set(tokenize(text)):
+            posting = self._postings[token]
+            del posting[did]
+            if not posting:
+                del self._postings[token]
+                self._vocab = None
+        del self._payloads[did]
+        self._groups[group].discard(did)
+        self._total -= length
+
+    def sync(self, group, docs):
+        """Update the group to contain exactly the (id, text, payload) docs.
+
+        Return number of documents added, changed or removed.
+        """
+        changes = 0
+        with self._lock:
+            old = set(self._groups.get(group, ()))
+            for did, text, payload in docs:
+                old.discard(did)
+                doc = self._docs.get(did)
+                if doc is not None and doc[0] == text and doc[2] == group:
+                    self._payloads[did] = payload
+                    continue
+                if doc is not None:
+                    self._remove(did)
+                self._add(did, text, group, payload)
+                changes += 1
+            for did in old:
+                self._remove(did)
+                changes += 1
+            if not self._groups.get(group):
+                self._groups.pop(group, None)
+        return changes
+
+    def retain(self, groups):
+        """Drop all the groups not in groups."""
+        for group in set(self._groups) - set(groups):
+            self.sync(group, ())
+
+    def _expand(self, token):
+        """Return tokens in the index starting with token."""
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            yield self._vocab[i]
+            i += 1
+
+    def search(self, query, limit=10):
+        """Return up to limit (score, payload) matching all query words.
+
+        The last word of the query matches as a prefix.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            n = len(self._docs)
+            if not n:
+                return []
+            avglen = self._total / n
+            scores = None
+            for i, word in enumerate(words):
+                tokens = self._expand(word) if i == len(words) - 1 \
+                    else [word]
+                partial = Counter()
+                for token in tokens:
+                    posting = self._postings.get(token, {})
+                    idf = math.log(1 + (n - len(posting) + 0.5)
+                                   / (len(posting) + 0.5))
+                    for did, tf in posting.items():
+                        length = self._docs[did][1]
+                        norm = 1 - self.b + self.b * length / avglen
+                        partial[did] += idf * tf * (self.k1 + 1) \
+                            / (tf + self.k1 * norm)
+                if scores is None:
+                    scores = partial
+                else:
+                    # Keep only documents matching every word
+                    scores = Counter({d: s + partial[d]
+                                      for d, s in scores.items()
+                                      if d in partial})
+                if not scores:
+                    return []
+            return [(s, self._payloads[d])
+                    for d, s in scores.most_common(limit)]
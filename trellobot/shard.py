@@ -0,0 +1,82 @@
+"""Scan boards in a pool of processes, for very large accounts.
+
+Fetching, JSON decoding, date parsing and Card construction happen in
+worker processes, each handling a shard of the boards. Workers return
+compact summaries, which the parent turns back into cards. Workers are
+not forked from the bot, whose threads may hold locks, but started by a
+fork server (or spawned, where fork servers are not available).
+"""
+
+
+import multiprocessing
+from datetime import datetime, timezone
+from trellobot.entities import Card, CheckItem
+from trellobot.trello import TrelloManager
+
+
+def _pack(card):
+    """Convert a card or check item to a compact tuple, due as epoch."""
+    due = card.due.timestamp() if card.due is not None else None
+    if isinstance(card, CheckItem):
+        return (card.id, card.name, card.url, due, card.dueComplete,
+                card.idCard)
+    return (card.id, card.name, card.url, due, card.dueComplete, None,
+            card.desc)
+
+
+def _unpack(summary):
+    """Convert a compact tuple back to a card or check item."""
+    cid, name, url, due, complete, card = summary[:6]
+    if due is not None:
+        due = datetime.fromtimestamp(due, timezone.utc)
+    if card is not None:
+        return CheckItem(cid, name, url, due, complete, card)
+    return Card(cid, name, url, due, complete, summary[6])
+
+
+def scan_shard(client_factory, bids):
+    """Fetch cards of given boards, return their summaries by board."""
+    tm = TrelloManager(None, None, None, client=client_factory())
+    return [(bid, [_pack(c)
+                   for c in tm.fetch_cards(bid=bid, checkitems=True)])
+            for bid in bids]
+
+
+class ShardedScanner:
+    """Split boards across a process pool and fetch their cards."""
+
+    shards_per_worker = 4  # More shards than workers, to balance load
+
+    def __init__(self, client_factory, workers):
+        """Create a scanner building Trello clients with client_factory.
+
+        client_factory must be picklable, as it is called in the workers.
+        """
+        self._factory = client_factory
+        self.workers = workers
+        self._pool = None
+
+    def _start(self):
+        """Start the worker processes."""
+        methods = multiprocessing.get_all_start_methods()
+        method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self._pool = multiprocessing.get_context(method).Pool(self.workers)
+
+    def scan(self, bids):
+        """Generate (board id, cards) for every board id."""
+        if self._pool is None:
+            self._start()
+        n = max(1, min(len(bids), self.workers * self.shards_per_worker))
+        shards = [bids[i::n] for i in range(n)]
+        results = [self._pool.apply_async(scan_shard, (self._factory, s))
+                   for s in shards if s]
+        for r in results:
+            for bid, summaries in r.get():
+                yield bid, [_unpack(s) for s in summaries]
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,89 @@
+"""Trace spans of scans, exportable as Chrome trace events.
+
+Spans are recorded only when the tracer is enabled, otherwise span()
+returns a shared context manager doing nothing:
+
+    with span('fetch_cards', board=bid):
+        ...
+
+Exported files can be opened in chrome://tracing or Perfetto.
+"""
+
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NoSpan:
+    """Context manager used when tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_ty, exc_va, exc_tb):
+        pass
+
+
+_no_span = _NoSpan()
+
+
+class _Span:
+    """A span being recorded."""
+
+    __slots__ = ('_tracer', '_name', '_args', '_ts')
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._ts = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_ty, exc_va, exc_tb):
+        end = time.perf_counter()
+        if exc_ty is not None:
+            self._args['error'] = exc_ty.__name__
+        self._tracer.events.append({
+            'name': self._name, 'ph': 'X', 'pid': os.getpid(),
+            'tid': threading.get_ident(), 'ts': self._ts * 1e6,
+            'dur': (end - self._ts) * 1e6, 'args': self._args,
+        })
+
+
+class Tracer:
+    """Collect the most recent spans."""
+
+    def __init__(self, maxlen=100000):
+        """Create a disabled tracer keeping at most maxlen spans."""
+        self.enabled = False
+        self.events = deque(maxlen=maxlen)
+
+    def span(self, name, **args):
+        """Return a context manager recording a span, if enabled."""
+        if not self.enabled:
+            return _no_span
+        return _Span(self, name, args)
+
+    def clock(self):
+        """Return current time in the unit of span timestamps."""
+        return time.perf_counter() * 1e6
+
+    def export(self, path, since=None):
+        """Write spans (started after since) as Chrome trace JSON."""
+        events = [e for e in list(self.events)
+                  if since is None or e['ts'] >= since]
+        with open(path, 'wt') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+# Tracer shared by the whole bot
+tracer = Tracer()
+span = tracer.span
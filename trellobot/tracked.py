@@ -0,0 +1,94 @@
+"""Due dates of tracked cards, kept in columns updated in place.
+
+Columns are stdlib arrays, so tracking does not need NumPy: snapshots
+copy them into NumPy arrays, without visiting every card in Python.
+"""
+
+
+from array import array
+
+NAN = float('nan')
+
+
+class TrackedDues:
+    """Columns of due dates, one row per tracked card or check item."""
+
+    def __init__(self):
+        """Create empty columns."""
+        self._rows = {}  # Card ID -> row
+        self._free = []  # Rows of removed cards, to be reused
+        self._codes = {}  # Board ID -> index in boards
+        self.boards = []  # Board IDs seen, by index
+        self.ids = []  # Card ID of each row
+        self.live = array('b')  # Whether row holds a tracked card
+        self.board = array('i')
+        self.due = array('d')
+        self.complete = array('b')
+        self.completed = array('d')  # NaN if completion was not observed
+
+    def __len__(self):
+        """Return number of tracked cards."""
+        return len(self._rows)
+
+    def __contains__(self, cid):
+        """Return True if the card is tracked."""
+        return cid in self._rows
+
+    def _row(self, cid):
+        """Return row of card, allocating one if not tracked."""
+        row = self._rows.get(cid)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+            self.ids[row] = cid
+        else:
+            row = len(self.ids)
+            self.ids.append(cid)
+            for col in (self.live, self.board, self.complete):
+                col.append(0)
+            self.due.append(NAN)
+            self.completed.append(NAN)
+        self._rows[cid] = row
+        return row
+
+    def set(self, cid, bid, due, complete, completed=NAN):
+        """Track a card in board bid, due and completed as epoch."""
+        code = self._codes.get(bid)
+        if code is None:
+            code = self._codes[bid] = len(self.boards)
+            self.boards.append(bid)
+        row = self._row(cid)
+        self.live[row] = 1
+        self.board[row] = code
+        self.due[row] = due
+        self.complete[row] = complete
+        self.completed[row] = completed
+
+    def completed_at(self, cid):
+        """Return epoch when completion of card was observed, or NaN."""
+        row = self._rows.get(cid)
+        return NAN if row is None else self.completed[row]
+
+    def remove(self, cid):
+        """Stop tracking a card, if tracked."""
+        row = self._rows.pop(cid, None)
+        if row is not None:
+            self.live[row] = 0
+            self.ids[row] = None
+            self._free.append(row)
+
+    def snapshot(self):
+        """Return a Snapshot of the tracked cards."""
+        import numpy as np
+        from trellobot.analytics import Snapshot
+        live = np.frombuffer(self.live, dtype=np.int8).astype(bool)
+        ids = np.array(self.ids, dtype=object)[live].astype(str)
+
+        def column(col, dtype):
+            return np.frombuffer(col, dtype=dtype)[live].copy()
+        return Snapshot(ids, np.array(self.boards, dtype=str),
+                        column(self.board, np.int32),
+                        column(self.due, np.float64),
+                        column(self.complete, np.int8).astype(bool),
+                        column(self.completed, np.float64))
@@ -1,28 +1,69 @@
 """Manage all the trello things."""
 
 
-from trello import TrelloClient
-from dateutil.parser import parse as parse_date
-from trellobot.entities import Organization, Board, Card
+from trellobot.entities import Organization, Board, Card, CheckItem
+from trellobot.flight import SingleFlight
+from trellobot.planner import FetchPlanner
+from trellobot.tracing import span
+from functools import partial
 import logging
+import time
+
+
+# py-trello pulls in requests and oauth: it is imported on first use
+TrelloClient = None
+
+
+def parse_date(s):
+    """Parse a date from Trello, importing dateutil on first use."""
+    from dateutil.parser import parse
+    return parse(s)
 
 
 class TrelloManager:
     """Manage Trello connection and data."""
 
-    def __init__(self, api_key, api_secret, token):
-        """Create a new TrelloManager using provided keys."""
-        self._cl = TrelloClient(
-            api_key=api_key,
-            api_secret=api_secret,
-            token=token,
-        )
+    def __init__(self, api_key, api_secret, token, client=None):
+        """Create a new TrelloManager using provided keys.
+
+        The Trello client is built on first use, unless one is provided.
+        """
+        self._keys = dict(api_key=api_key, api_secret=api_secret, token=token)
+        self._client = client
 
         # Start whitelisting no organization
         self._wl_org = set()
         # Start whitelisting no board
         self._wl_brd = set()
 
+        # Choose how to fetch cards, remembering the boards seen
+        self.planner = FetchPlanner()
+        self.plan = None
+        # Function returning the plan to use instead of the cheapest, if
+        # any (e.g. replays pin the recorded plans)
+        self.pinned_plan = None
+        # Boards listed in latest scan, by ID
+        self.boards = {}
+        # Identical requests in flight are made once
+        self._requests = SingleFlight()
+
+    @property
+    def _cl(self):
+        """Return the Trello client, creating it if necessary."""
+        global TrelloClient
+        if self._client is None:
+            if TrelloClient is None:
+                from trello import TrelloClient
+            self._client = TrelloClient(**self._keys)
+        return self._client
+
+    def client_factory(self):
+        """Return a picklable function building a new Trello client."""
+        global TrelloClient
+        if TrelloClient is None:
+            from trello import TrelloClient
+        return partial(TrelloClient, **self._keys)
+
     def whitelist_org(self, oid):
         """Add an organization to whitelist, by ID."""
         self._wl_org.add(oid)
@@ -39,20 +80,39 @@ class TrelloManager:
         """Blacklist a board by id."""
         self._wl_brd.discard(bid)
 
+    def whitelisted_brds(self):
+        """Return IDs of whitelisted boards."""
+        return set(self._wl_brd)
+
+    def _fetch(self, path, **params):
+        """Fetch JSON from Trello, sharing identical requests in flight.
+
+        The JSON can be shared among callers: it must not be modified.
+        """
+        key = (path, tuple(sorted(params.items())))
+        return self._requests.do(key, self._get, path, params)
+
+    def _get(self, path, params):
+        """Fetch JSON from Trello, tracing the request."""
+        with span('fetch_json', path=path):
+            if params:
+                return self._cl.fetch_json(path, query_params=params)
+            return self._cl.fetch_json(path)
+
     def org_names(self):
         """Fetch and return organization names."""
         return {o.name for o in self.fetch_orgs()}
 
     def fetch_orgs(self):
         """Generate organizations and their blacklistedness."""
-        for o in self._cl.fetch_json('/members/me/organizations/'):
+        for o in self._fetch('/members/me/organizations/'):
             yield Organization(o['id'], o['name'],
                                o['id'] not in self._wl_org, o['url'])
 
     def fetch_boards(self, org=None):
         """Generate boards (in given org) and their blacklistedness."""
         if org is None:
-            for b in self._cl.fetch_json('/members/me/boards/'):
+            for b in self._fetch('/members/me/boards/'):
                 # If board has not an organization, it is blacklisted iff
                 # it's not in the whitelist
                 bbl = b['id'] not in self._wl_brd
@@ -76,7 +136,7 @@ class TrelloManager:
             if org not in id2na:
                 return
 
-            for b in self._cl.fetch_json(f'/organizations/{org}/boards/'):
+            for b in self._fetch(f'/organizations/{org}/boards/'):
                 bl = b['id'] not in self._wl_brd
                 yield Board(b['id'], b['name'], bl, b['url'])
 
@@ -86,20 +146,104 @@ class TrelloManager:
         # for l in board.list_lists():
         #    yield l
 
-    def fetch_cards(self, lid=None, bid=None):
-        """Generate cards from list, board or everything."""
+    def fetch_cards(self, lid=None, bid=None, checkitems=False):
+        """Generate cards from list, board or everything.
+
+        If checkitems is True, checklists are fetched in the same request,
+        and check items with a due date are generated after their card.
+        """
+        params = {'checklists': 'all'} if checkitems else {}
         if bid is not None:
-            seq = self._cl.fetch_json(f'/boards/{bid}/cards')
+            seq = self._fetch(f'/boards/{bid}/cards', **params)
         elif lid is not None:
-            seq = self._cl.fetch_json(f'/lists/{lid}/cards')
+            seq = self._fetch(f'/lists/{lid}/cards', **params)
         else:
-            seq = self._cl.fetch_json(f'/members/me/cards')
+            seq = self._fetch(f'/members/me/cards', **params)
 
         for c in seq:
-            if c['due'] is not None:
-                c['due'] = parse_date(c['due'])
-            yield Card(c['id'], c['name'],
-                       c['url'], c['due'], c['dueComplete'])
+            yield from self._parse_card(c)
+
+    def _parse_card(self, c):
+        """Build a Card from its JSON, followed by check items with due."""
+        due = parse_date(c['due']) if c['due'] is not None else None
+        yield Card(c['id'], c['name'],
+                   c['url'], due, c['dueComplete'], c.get('desc', ''))
+        for cl in c.get('checklists', ()):
+            for i in cl['checkItems']:
+                if i.get('due') is not None:
+                    yield CheckItem(i['id'], i['name'], c['url'],
+                                    parse_date(i['due']),
+                                    i['state'] == 'complete', c['id'])
+
+    def fetch_board_cards(self):
+        """Return a generator of (board id, cards) of whitelisted boards.
+
+        The plan is chosen immediately, the cheapest unless pinned, and
+        saved in plan: 'board' fetches cards board by board, 'account'
+        fetches all the boards of the account with their cards, in a
+        single request.
+        """
+        wl = [b for b in self.boards if b in self._wl_brd]
+        if self.pinned_plan is not None:
+            self.plan = self.pinned_plan()
+        elif not self.boards:
+            # Boards are unknown, so are costs
+            self.plan = 'board'
+        else:
+            self.plan = self.planner.choose(wl, list(self.boards))
+        logging.info('Fetching cards with %s plan', self.plan)
+        if self.plan == 'account':
+            return self._fetch_account_cards()
+        return self._fetch_per_board_cards()
+
+    def list_boards(self):
+        """Fetch boards and their blacklistedness, remembering them."""
+        t = time.perf_counter()
+        with span('fetch_boards'):
+            boards = list(self.fetch_boards())
+        self.planner.observe(0, time.perf_counter() - t)
+        self._seen(boards)
+        return boards
+
+    def _seen(self, boards):
+        """Remember the boards listed, forgetting the others."""
+        self.boards = {b.id: b for b in boards}
+        self.planner.forget(self.boards)
+
+    def _fetch_per_board_cards(self):
+        """Generate cards of whitelisted boards, one request per board."""
+        for b in self.list_boards():
+            if b.blacklisted:
+                continue
+            t = time.perf_counter()
+            with span('fetch_cards', board=b.id):
+                cards = list(self.fetch_cards(bid=b.id, checkitems=True))
+            self.planner.observe(len(cards), time.perf_counter() - t)
+            self.planner.sizes[b.id] = len(cards)
+            yield b.id, cards
+
+    def _fetch_account_cards(self):
+        """Generate cards of whitelisted boards, with a single request."""
+        t = time.perf_counter()
+        with span('fetch_cards', board='*'):
+            boards = self._fetch('/members/me/boards/', cards='visible',
+                                 card_checklists='all')
+        elapsed = time.perf_counter() - t
+        if boards and 'cards' not in boards[0]:
+            # Nested cards were not returned: never use this plan again
+            logging.warning('Account plan not supported, using board plan')
+            self.planner.account_supported = False
+            self.plan = 'board'
+            yield from self._fetch_per_board_cards()
+            return
+        self.planner.observe(sum(len(b['cards']) for b in boards), elapsed)
+        self._seen([Board(b['id'], b['name'], b['id'] not in self._wl_brd,
+                          b['url']) for b in boards])
+        for b in boards:
+            self.planner.sizes[b['id']] = len(b['cards'])
+            if b['id'] in self._wl_brd:
+                yield b['id'], [d for c in b['cards']
+                                for d in self._parse_card(c)]
 
     def deprecated_fetch_data(self):
         """Fetch all the data from the server, updating cache."""
@@ -0,0 +1,93 @@
+"""Receive Telegram updates with a webhook, served by a local listener.
+
+Telegram POSTs each update as JSON to the webhook URL: the listener
+decodes it and puts it in the update queue of the dispatcher, which runs
+handlers in its worker pool. The listener can be tested locally by
+POSTing recorded updates:
+
+    curl -d @update.json http://127.0.0.1:8443/
+"""
+
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request in a thread."""
+
+    daemon_threads = True
+
+
+class WebhookListener:
+    """Local HTTP listener putting Telegram updates in a queue."""
+
+    def __init__(self, bot, update_queue, host='127.0.0.1', port=8443,
+                 path='/'):
+        """Create a listener for updates POSTed to path.
+
+        Use a hard to guess path (e.g. including the bot token) when the
+        listener is reachable from the internet.
+        """
+        self.bot = bot
+        self.update_queue = update_queue
+        self.path = path
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def port(self):
+        """Return the port the listener is bound to."""
+        return self._server.server_address[1]
+
+    def _handler(self):
+        """Build the request handler class bound to this listener."""
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != listener.path:
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    data = json.loads(self.rfile.read(length))
+                    listener.put(data)
+                except Exception:
+                    # Bad requests must not kill the handler thread
+                    logging.warning('Webhook: bad update', exc_info=True)
+                    self.send_error(400)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, fmt, *args):
+                logging.debug('Webhook: ' + fmt, *args)
+
+        return Handler
+
+    def put(self, data):
+        """Decode an update from JSON data and enqueue it."""
+        from telegram import Update
+        update = Update.de_json(data, self.bot)
+        if update is None:
+            raise ValueError('Not an update')
+        self.update_queue.put(update)
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='webhook', daemon=True)
+        self._thread.start()
+        logging.info('Webhook listening on port %d', self.port)
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()